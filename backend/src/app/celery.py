@@ -1,8 +1,12 @@
 import os
 
 from celery import Celery
+from celery import signals
 from django.conf import settings
 
+from app import metrics
+from app import tracing
+
 __all__ = [
     'celery',
 ]
@@ -14,3 +18,27 @@ celery = Celery('app')
 celery.config_from_object('django.conf:settings', namespace='CELERY')
 
 celery.autodiscover_tasks(lambda: settings.INSTALLED_APPS)
+
+# Queue wait is measured from the publish time sent along with a task
+signals.before_task_publish.connect(metrics.on_task_published)
+
+signals.task_prerun.connect(metrics.on_task_prerun)
+
+signals.before_task_publish.connect(tracing.on_task_published)
+
+signals.task_prerun.connect(tracing.on_task_prerun)
+
+signals.task_failure.connect(tracing.on_task_failure)
+
+signals.task_postrun.connect(tracing.on_task_postrun)
+
+
+@signals.worker_init.connect
+def clear_metrics(**kwargs):
+    metrics.clear_multiproc_dir()
+
+
+@signals.worker_init.connect
+def setup_tracing(**kwargs):
+    # The gevent pool does not fork, spans are exported by the worker itself
+    tracing.setup('celery')
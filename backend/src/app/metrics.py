@@ -0,0 +1,163 @@
+import base64
+import contextlib
+import glob
+import hmac
+import os
+import time
+import typing as tp
+
+from django import http
+from django.conf import settings
+import prometheus_client
+from prometheus_client import multiprocess
+
+
+__all__ = [
+    'SUBMISSION_STAGE_SECONDS',
+    'CELERY_QUEUE_WAIT_SECONDS',
+    'API_CALLS',
+    'API_ERRORS',
+    'stage',
+    'api_call',
+    'clear_multiproc_dir',
+    'mark_process_dead',
+    'metrics_view',
+]
+
+PUBLISHED_AT_HEADER = 'published_at'
+
+_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Stages: upload, s3_download, decode, github, notify and processing, the
+# whole start_processing call
+SUBMISSION_STAGE_SECONDS = prometheus_client.Histogram(
+    'bot_submission_stage_seconds',
+    'Time spent by a submission in a stage of the pipeline',
+    ['stage'],
+    buckets=_BUCKETS,
+)
+
+CELERY_QUEUE_WAIT_SECONDS = prometheus_client.Histogram(
+    'bot_celery_queue_wait_seconds',
+    'Time between publishing and starting a celery task',
+    ['task'],
+    buckets=_BUCKETS,
+)
+
+API_CALLS = prometheus_client.Counter(
+    'bot_api_calls_total',
+    'Calls to GitHub and Telegram APIs',
+    ['service', 'method'],
+)
+
+API_ERRORS = prometheus_client.Counter(
+    'bot_api_errors_total',
+    'Failed calls to GitHub and Telegram APIs',
+    ['service', 'method'],
+)
+
+
+@contextlib.contextmanager
+def stage(name: str) -> tp.Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        SUBMISSION_STAGE_SECONDS.labels(name).observe(
+            time.perf_counter() - started
+        )
+
+
+@contextlib.contextmanager
+def api_call(service: str, method: str) -> tp.Iterator[None]:
+    API_CALLS.labels(service, method).inc()
+    try:
+        yield
+    except Exception:
+        API_ERRORS.labels(service, method).inc()
+        raise
+
+
+def on_task_published(headers: tp.Optional[dict] = None, **kwargs) -> None:
+    if headers is not None:
+        headers[PUBLISHED_AT_HEADER] = time.time()
+
+
+def on_task_prerun(task=None, **kwargs) -> None:
+    published_at = getattr(task.request, PUBLISHED_AT_HEADER, None)
+    if published_at is None:
+        # Custom headers are nested with older message protocols
+        published_at = (task.request.headers or {}).get(PUBLISHED_AT_HEADER)
+    if published_at is None:
+        return
+
+    # Clocks of the publisher and the worker may be slightly apart
+    CELERY_QUEUE_WAIT_SECONDS.labels(task.name).observe(
+        max(time.time() - published_at, 0)
+    )
+
+
+def clear_multiproc_dir() -> None:
+    """Remove files left by the processes of a previous run of the service"""
+    path = settings.PROMETHEUS_MULTIPROC_DIR
+    if not path:
+        return
+
+    os.makedirs(path, exist_ok=True)
+    for name in glob.glob(os.path.join(path, '*.db')):
+        os.remove(name)
+
+
+def mark_process_dead(pid: int) -> None:
+    if settings.PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid, settings.PROMETHEUS_MULTIPROC_DIR)
+
+
+class _MultiProcessCollector:
+    def collect(self):
+        # Each service writes into its own directory of the shared volume
+        files = glob.glob(
+            os.path.join(
+                os.path.dirname(settings.PROMETHEUS_MULTIPROC_DIR.rstrip('/')),
+                '*',
+                '*.db',
+            )
+        )
+        return multiprocess.MultiProcessCollector.merge(files)
+
+
+def _is_authorized(request: http.HttpRequest) -> bool:
+    scheme, _, credentials = request.META.get(
+        'HTTP_AUTHORIZATION', ''
+    ).partition(' ')
+    if scheme.lower() != 'basic':
+        return False
+
+    try:
+        credentials = base64.b64decode(credentials)
+    except ValueError:
+        return False
+
+    return hmac.compare_digest(credentials, settings.METRICS_AUTH.encode())
+
+
+def metrics_view(request: http.HttpRequest) -> http.HttpResponse:
+    if not settings.METRICS_AUTH:
+        raise http.Http404
+
+    if not _is_authorized(request):
+        response = http.HttpResponse(status=401)
+        response['WWW-Authenticate'] = 'Basic realm="metrics"'
+        return response
+
+    if settings.PROMETHEUS_MULTIPROC_DIR:
+        # Metrics of all gunicorn and celery processes
+        registry = prometheus_client.CollectorRegistry()
+        registry.register(_MultiProcessCollector())
+    else:
+        registry = prometheus_client.REGISTRY
+
+    return http.HttpResponse(
+        prometheus_client.generate_latest(registry),
+        content_type=prometheus_client.CONTENT_TYPE_LATEST,
+    )
@@ -74,6 +74,20 @@ WSGI_APPLICATION = 'app.wsgi.application'
 
 DATABASES = {'default': env.db('DATABASE_URL')}
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'pylindabot',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    # Seen by the web and celery processes, the table is created by the
+    # 0021_shared_cache_table migration
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'bot_shared_cache',
+    },
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': f'django.contrib.auth.password_validation.{validator}'}
     for validator in [
@@ -127,7 +141,7 @@ LOGGING = {
         'console': {'class': 'logging.StreamHandler', 'formatter': 'verbose'}
     },
     'loggers': {
-        '': {'handlers': ['console'], 'level': 'DEBUG' if DEBUG else 'DEBUG'},
+        '': {'handlers': ['console'], 'level': 'DEBUG' if DEBUG else 'INFO'},
         'django': {
             'handlers': [
                 # 'console'
@@ -168,6 +182,34 @@ if CELERY_BROKER_URL is None:  # for production
 
 CELERY_TASK_DEFAULT_QUEUE = 'celery-test' if DEBUG else 'celery'
 
+# Read by prometheus_client itself, a directory per service on a shared volume
+PROMETHEUS_MULTIPROC_DIR = env.str('prometheus_multiproc_dir', default=None)
+
+# user:password for basic auth of /metrics, the endpoint is disabled if not set
+METRICS_AUTH = env.str('METRICS_AUTH', default=None)
+
+# otlp, file or None to disable tracing
+TRACING_EXPORTER = env.str('TRACING_EXPORTER', default=None)
+
+# OTEL_EXPORTER_OTLP_ENDPOINT or localhost if not set
+TRACING_OTLP_ENDPOINT = env.str('TRACING_OTLP_ENDPOINT', default=None)
+
+TRACING_FILE = env.str(
+    'TRACING_FILE', default=os.path.join(CACHE_DIR, 'spans.jsonl')
+)
+
+CELERY_BEAT_SCHEDULE = {
+    # Unchanged gists cost a 304 thanks to the stored ETag
+    'refresh-gists': {
+        'task': 'bot.tasks.refresh_gists',
+        'schedule': 10 * 60,
+    },
+    'provision-repositories': {
+        'task': 'bot.tasks.provision_repositories',
+        'schedule': 6 * 60 * 60,
+    },
+}
+
 YC_S3_URL = 'https://storage.yandexcloud.net'
 
 YC_S3_BUCKET = 'pylindabot'
@@ -178,6 +220,9 @@ TELEGRAM_TOKEN = env.str('TELEGRAM_TOKEN')
 
 TELEGRAM_BOT_S3_BUCKET_PREFIX = 'bot/hws'
 
+# Loads bot/logic/messages/<locale>.yaml over the default messages
+BOT_LOCALE = env.str('BOT_LOCALE', default=None)
+
 AWS_ACCESS_KEY_ID = env.str('AWS_ACCESS_KEY_ID')
 
 AWS_SECRET_ACCESS_KEY = env.str('AWS_SECRET_ACCESS_KEY')
@@ -192,6 +237,9 @@ GITHUB_INSTALLATION_ID = env.int('GITHUB_INSTALLATION_ID')
 
 GITHUB_APP_PEM = env.str('GITHUB_APP_PEM', multiline=True)
 
+# owner/name of a template for assignment repositories, e.g. pykili/template
+GITHUB_TEMPLATE_REPO = env.str('GITHUB_TEMPLATE_REPO', default=None)
+
 BOT_PERSISTENCE_PICKLE_FILE = (
     BASE_DIR('.bot_persistence')
     if DEBUG
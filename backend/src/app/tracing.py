@@ -0,0 +1,130 @@
+import functools
+import logging
+import os
+import typing as tp
+
+from django.conf import settings
+from opentelemetry import context
+from opentelemetry import propagate
+from opentelemetry import trace
+from opentelemetry.instrumentation.botocore import BotocoreInstrumentor
+from opentelemetry.instrumentation.requests import RequestsInstrumentor
+from opentelemetry.propagators import textmap
+from opentelemetry.sdk import resources
+from opentelemetry.sdk import trace as sdk_trace
+from opentelemetry.sdk.trace import export
+
+
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    'tracer',
+    'setup',
+    'traced',
+]
+
+EXPORTER_OTLP = 'otlp'
+
+EXPORTER_FILE = 'file'
+
+_TASK_SPAN_ATTR = '_tracing_span'
+
+# Proxy until setup() sets the provider, spans are no-op without it
+tracer = trace.get_tracer('bot')
+
+
+def _create_exporter() -> tp.Optional[export.SpanExporter]:
+    if settings.TRACING_EXPORTER == EXPORTER_OTLP:
+        # Heavy protobuf imports, only when the exporter is used
+        from opentelemetry.exporter.otlp.proto.http import trace_exporter
+
+        return trace_exporter.OTLPSpanExporter(
+            endpoint=settings.TRACING_OTLP_ENDPOINT
+        )
+
+    if settings.TRACING_EXPORTER == EXPORTER_FILE:
+        return export.ConsoleSpanExporter(
+            out=open(settings.TRACING_FILE, 'a'),
+            formatter=lambda span: span.to_json(indent=None) + os.linesep,
+        )
+
+    return None
+
+
+def setup(service_name: str) -> None:
+    """Export spans of this process if TRACING_EXPORTER is set"""
+    exporter = _create_exporter()
+    if exporter is None:
+        return
+
+    logger.info('Exporting spans of %s to %s', service_name, exporter)
+
+    provider = sdk_trace.TracerProvider(
+        resource=resources.Resource.create(
+            {resources.SERVICE_NAME: service_name}
+        )
+    )
+    provider.add_span_processor(export.BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+
+    # GitHub calls go through requests, S3 calls through botocore
+    RequestsInstrumentor().instrument()
+    BotocoreInstrumentor().instrument()
+
+
+def traced(func: tp.Callable) -> tp.Callable:
+    name = f'{func.__module__}.{func.__qualname__}'
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with tracer.start_as_current_span(name):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+class _TaskRequestGetter(textmap.Getter):
+    def get(self, carrier: tp.Any, key: str) -> tp.Optional[tp.List[str]]:
+        value = getattr(carrier, key, None)
+        if value is None:
+            # Custom headers are nested with older message protocols
+            value = (carrier.headers or {}).get(key)
+        return None if value is None else [value]
+
+    def keys(self, carrier: tp.Any) -> tp.List[str]:
+        return []
+
+
+_task_request_getter = _TaskRequestGetter()
+
+
+def on_task_published(headers: tp.Optional[dict] = None, **kwargs) -> None:
+    if headers is not None:
+        propagate.inject(headers)
+
+
+def on_task_prerun(task_id=None, task=None, **kwargs) -> None:
+    parent = propagate.extract(task.request, getter=_task_request_getter)
+    span = tracer.start_span(
+        task.name, context=parent, kind=trace.SpanKind.CONSUMER
+    )
+    span.set_attribute('celery.task_id', task_id)
+
+    token = context.attach(trace.set_span_in_context(span))
+    setattr(task.request, _TASK_SPAN_ATTR, (span, token))
+
+
+def on_task_failure(sender=None, exception=None, **kwargs) -> None:
+    span, _ = getattr(sender.request, _TASK_SPAN_ATTR, (None, None))
+    if span is not None:
+        span.record_exception(exception)
+        span.set_status(trace.Status(trace.StatusCode.ERROR))
+
+
+def on_task_postrun(task=None, **kwargs) -> None:
+    span, token = getattr(task.request, _TASK_SPAN_ATTR, (None, None))
+    if span is None:
+        return
+
+    context.detach(token)
+    span.end()
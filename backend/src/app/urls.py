@@ -2,8 +2,11 @@ from django.conf import settings
 from django.contrib import admin
 from django.urls import include, path
 
+from app import metrics
+
 urlpatterns = [
     path('api/bot', include('bot.urls')),
+    path('metrics', metrics.metrics_view),
 ]
 
 if settings.ADMIN_ENABLED:
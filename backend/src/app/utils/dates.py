@@ -9,11 +9,27 @@ def now_aware():
     return now_utc
 
 
+def parse_timestring(timestring: str) -> datetime.datetime:
+    """Parse ISO-8601 directly, fall back to dateparser for anything else"""
+    try:
+        if timestring.endswith('Z'):
+            timestring = timestring[:-1] + '+00:00'
+        return datetime.datetime.fromisoformat(timestring)
+    except ValueError:
+        pass
+
+    # Not cached, relative inputs like "вчера" depend on the current time
+    time = dateparser.parse(timestring)
+    if time is None:
+        raise ValueError(f'Unknown time format: {timestring}')
+    return time
+
+
 def parse_timestring_aware(
     timestring: str,
     timezone: str = 'Europe/Moscow',
 ) -> datetime.datetime:
-    time = dateparser.parse(timestring)
+    time = parse_timestring(timestring)
     if time.tzinfo is None:
         time = pytz.timezone(timezone).localize(time)
     utctime = time.astimezone(pytz.utc)
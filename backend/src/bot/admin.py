@@ -40,4 +40,5 @@ admin.site.register(models.Submission, SubmissionAdmin)
 admin.site.register(models.BotUser, BotUserAdmin)
 admin.site.register(models.GithubRepository)
 admin.site.register(models.AssignmentGistCache)
+admin.site.register(models.GistRevision)
 admin.site.register(models.SubmissionEvent)
@@ -0,0 +1,40 @@
+import ijson
+from rest_framework import exceptions, parsers
+
+
+SCALAR_EVENTS = {'string', 'number', 'boolean', 'null'}
+
+
+# Streams the body and keeps only the fields passed in the parser context.
+# Parsing stops as soon as all of them are found, so the tail of large push
+# and pull_request payloads (commits, repository, sender) is never read
+class GithubWebhookParser(parsers.BaseParser):
+    media_type = 'application/json'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        fields = (parser_context or {}).get('fields', set())
+        payload = {}
+
+        if stream is None or not fields:
+            return payload
+
+        missing = set(fields)
+
+        try:
+            for prefix, event, value in ijson.parse(stream):
+                if event in SCALAR_EVENTS and prefix in missing:
+                    _set_path(payload, prefix, value)
+                    missing.discard(prefix)
+                    if not missing:
+                        break
+        except ijson.JSONError as exc:
+            raise exceptions.ParseError(f'JSON parse error - {exc}')
+
+        return payload
+
+
+def _set_path(payload: dict, path: str, value) -> None:
+    *parents, key = path.split('.')
+    for parent in parents:
+        payload = payload.setdefault(parent, {})
+    payload[key] = value
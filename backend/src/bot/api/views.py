@@ -4,6 +4,8 @@ import telegram as tg
 from rest_framework import permissions, request, response, views
 from telegram import ext as tg_ext
 
+from app import tracing
+from bot.api import parsers
 from bot.logic import tg as tg_logic
 from bot.logic import gh
 
@@ -22,6 +24,7 @@ class TelegramHookView(views.APIView):
         self.updater = tg_logic.create_updater()
         self.dispatcher = self.updater.dispatcher
 
+    @tracing.traced
     def post(self, request: request.Request, format=None):
         update = tg.Update.de_json(request.data, self.dispatcher.bot)
         logger.info('Incoming update: %s', update)
@@ -33,6 +36,7 @@ class TelegramHookView(views.APIView):
 
 class GithubHookView(views.APIView):
     permission_classes = (permissions.AllowAny,)
+    parser_classes = (parsers.GithubWebhookParser,)
 
     dispatcher: gh.EventDispatcher
 
@@ -40,6 +44,20 @@ class GithubHookView(views.APIView):
         super().__init__(*args, **kwargs)
         self.dispatcher = gh.EventDispatcher()
 
+    def get_parser_context(self, http_request):
+        context = super().get_parser_context(http_request)
+        context['fields'] = self.dispatcher.get_fields(http_request.META)
+        return context
+
+    @tracing.traced
     def post(self, request: request.Request, format=None):
+        # Check the event before request.data parses the body
+        if not self.dispatcher.is_supported(request.META):
+            logger.info(
+                'Unsupported GitHub event: %s. Skip',
+                request.META.get(gh.GITHUB_EVENT_HEADER),
+            )
+            return response.Response()
+
         self.dispatcher.dispatch(request.META, request.data)
         return response.Response()
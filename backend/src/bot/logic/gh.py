@@ -1,13 +1,21 @@
+import collections
+import dataclasses
 import datetime
+import functools
 import logging
+import reprlib
+import time
 import typing as tp
+from concurrent import futures
 
 from django.conf import settings
+from django.core.cache import cache
 import github
 import jwt
 import requests
 
 from app import exceptions
+from app import metrics
 from app.utils import dates as dates_utils
 from bot import models
 from bot.logic import gh_events
@@ -16,6 +24,18 @@ from bot.logic import notify
 
 logger = logging.getLogger(__name__)
 
+GITHUB_EVENT_HEADER = 'HTTP_X_GITHUB_EVENT'
+
+GITHUB_DELIVERY_HEADER = 'HTTP_X_GITHUB_DELIVERY'
+
+PAYLOAD_LOG_LIMIT = 1000
+
+GIST_DOWNLOAD_WORKERS = 4
+
+GITHUB_LOGIN_TIMEOUT = 24 * 60 * 60
+
+GITHUB_LOGIN_MISS_TIMEOUT = 10 * 60
+
 
 def _generate_jwt():
     now = dates_utils.now_aware().timestamp()
@@ -92,16 +112,24 @@ def _create_repository(
     org: github.Organization, user: models.BotUser, repo_name: str
 ) -> tp.Tuple[github.Repository.Repository, models.GithubRepository]:
     gh_repo = None
+    created = False
 
     try:
-        gh_repo = org.create_repo(
-            repo_name,
-            private=True,
-            has_issues=False,
-            has_wiki=False,
-            has_projects=False,
-        )
-    except github.GithubException as exc:
+        if settings.GITHUB_TEMPLATE_REPO:
+            _generate_repo(org, repo_name)
+            created = True
+        else:
+            gh_repo = org.create_repo(
+                repo_name,
+                private=True,
+                has_issues=False,
+                has_wiki=False,
+                has_projects=False,
+                # Git data API does not work with empty repositories
+                auto_init=True,
+            )
+            created = True
+    except (github.GithubException, requests.RequestException) as exc:
         logger.warning(
             'Exception while creating repo: %s. May be repo already exists?',
             exc,
@@ -117,7 +145,7 @@ def _create_repository(
             )
             raise
 
-    _bootstrap_repo(gh_repo, user)
+    _bootstrap_repo(gh_repo, user, created)
 
     db_repo = models.GithubRepository.objects.create(
         name=gh_repo.name, owner=user, url=gh_repo.html_url
@@ -126,89 +154,237 @@ def _create_repository(
     return gh_repo, db_repo
 
 
-def _bootstrap_repo(repo: github.Repository, user: models.BotUser) -> None:
-    logger.info('Bootstraping new repository')
+def _generate_repo(org: github.Organization, repo_name: str) -> None:
+    # PyGithub 1.53 cannot create repositories from a template
+    with metrics.api_call('github', 'generate_repo'):
+        resp = requests.post(
+            f'https://api.github.com/repos/{settings.GITHUB_TEMPLATE_REPO}'
+            f'/generate',
+            headers={
+                'Authorization': f'token {_get_or_create_token()}',
+                'Accept': 'application/vnd.github.baptiste-preview+json',
+            },
+            json={'owner': org.login, 'name': repo_name, 'private': True},
+            timeout=settings.GITHUB_TIMEOUT,
+        )
+        resp.raise_for_status()
+
+
+BOOTSTRAP_FILES = {
+    'README.md': (
+        'Репозитарий для домашних работ, тестов и контрольных.'
+        '\n\nСтудент: **{student_full_name}**'
+        '\n\nГруппа: **{student_group_name}**\n'
+    ),
+    # Marks the bootstrap as done, goes to the same commit as the files
+    '.bootstrap': '',
+}
+
+BOOTSTRAP_COMMIT_MESSAGE = 'initial bootstrap'
+
+COLLABORATOR_PERMISSION = 'push'
+
+
+def _get_head_ref(
+    repo: github.Repository, attempts: int
+) -> github.GitRef.GitRef:
+    error = None
+
+    # Repository generated from a template is filled asynchronously
+    for attempt in range(attempts):
+        if attempt:
+            time.sleep(attempt)
+        try:
+            return repo.get_git_ref(f'heads/{repo.default_branch}')
+        except github.GithubException as exc:
+            if exc.status not in (404, 409):
+                raise
+            error = exc
+
+    raise error or exceptions.BackendException(
+        f'Cannot get the default branch of {repo}'
+    )
+
+
+def _commit_bootstrap_files(
+    repo: github.Repository, user: models.BotUser, created: bool
+) -> None:
+    files = {
+        path: content.format(
+            student_full_name=user.full_name,
+            student_group_name=user.group_name,
+        )
+        for path, content in BOOTSTRAP_FILES.items()
+    }
 
     try:
-        repo.get_contents('.bootstrap')
-        logger.info('Repo %s already bootstrapped', repo)
-        return
+        ref = _get_head_ref(repo, settings.GITHUB_ATTEMPTS if created else 1)
     except github.GithubException as exc:
-        if exc.status == 404:
-            pass
-        else:
+        if created or exc.status != 409:
             raise
+        # Repositories created before auto_init are empty and the git data
+        # API does not work with them. The marker goes last
+        for path, content in files.items():
+            repo.create_file(path, BOOTSTRAP_COMMIT_MESSAGE, content)
+        return
 
-    bootstrap_settings = {
-        'files': [
-            {
-                'path': 'README.md',
-                'commit_msg': 'create readme file',
-                'content': (
-                    'Репозитарий для домашних работ, тестов и контрольных.'
-                    '\n\nСтудент: **{student_full_name}**'
-                    '\n\nГруппа: **{student_group_name}**\n'
-                ),
-            }
-        ],
-        "collaborator_permission": "push",
-    }
+    head = repo.get_git_commit(ref.object.sha)
 
-    if bootstrap_settings.get('files'):
-        for file in bootstrap_settings['files']:
-            content = (
-                file['content'].format(
-                    student_full_name=user.full_name,
-                    student_group_name=user.group_name,
-                )
-                if file['content']
-                else ''
+    tree = repo.create_git_tree(
+        [
+            github.InputGitTreeElement(
+                path, '100644', 'blob', content=content
             )
-            try:
-                repo.create_file(
-                    file['path'],
-                    file['commit_msg'],
-                    content,
-                )
-            except github.GithubException as exc:
-                # In fact this steps is not very important
-                logger.warning(exc)
+            for path, content in files.items()
+        ],
+        head.tree,
+    )
+    commit = repo.create_git_commit(BOOTSTRAP_COMMIT_MESSAGE, tree, [head])
+    ref.edit(commit.sha)
+
+
+def _bootstrap_repo(
+    repo: github.Repository, user: models.BotUser, created: bool = False
+) -> None:
+    logger.info('Bootstraping new repository')
+
+    # A template may contain the marker, only a repository created by an
+    # earlier attempt can be bootstrapped already
+    if not created:
+        try:
+            repo.get_contents('.bootstrap')
+            logger.info('Repo %s already bootstrapped', repo)
+            return
+        except github.GithubException as exc:
+            if exc.status != 404:
+                raise
 
     logger.info('Adding %s to collaborators', user)
 
-    invite = repo.add_to_collaborators(
-        user.github_login, bootstrap_settings['collaborator_permission']
-    )
+    # Invite does not depend on the repository content
+    with futures.ThreadPoolExecutor(max_workers=1) as executor:
+        invite_future = executor.submit(
+            repo.add_to_collaborators,
+            user.github_login,
+            COLLABORATOR_PERMISSION,
+        )
+        _commit_bootstrap_files(repo, user, created)
+        invite = invite_future.result()
 
     logger.info('Invite: %s', invite)
 
     if invite:
         notify.notify_invite_sent(user, repo.html_url)
 
-    repo.create_file('.bootstrap', 'initial bootstrap done', '')
+
+def _github_login_key(login: str) -> str:
+    return f'gh:login_exists:{login.lower()}'
 
 
 def is_github_user(login: str) -> bool:
-    anon_client = get_client(anon=True)
+    key = _github_login_key(login)
+    exists = cache.get(key)
+
+    if exists is not None:
+        return exists
+
+    # Installation client: anonymous quota is 60 requests per hour
+    client = get_client()
 
     try:
-        anon_client.get_user(login)
-        return True
+        with metrics.api_call('github', 'get_user'):
+            client.get_user(login)
+        exists = True
     except github.UnknownObjectException:
-        return False
+        exists = False
     except Exception as exc:
         logger.exception(exc)
         raise exceptions.BackendException
 
+    cache.set(
+        key,
+        exists,
+        GITHUB_LOGIN_TIMEOUT if exists else GITHUB_LOGIN_MISS_TIMEOUT,
+    )
+
+    return exists
+
+
+@dataclasses.dataclass
+class GistSnapshot:
+    revision: str
+    etag: tp.Optional[str]
+    files: tp.Dict[str, str]
+
+
+def _get_gist_file_content(headers: dict, gist_file: dict) -> str:
+    # API inlines only the first megabyte of a file
+    if not gist_file.get('truncated'):
+        return gist_file['content']
+
+    raw = requests.get(
+        gist_file['raw_url'], headers=headers, timeout=settings.GITHUB_TIMEOUT
+    )
+    raw.raise_for_status()
+    return raw.text
+
+
+def fetch_gist(
+    gist_id: str, etag: tp.Optional[str] = None
+) -> tp.Optional[GistSnapshot]:
+    """Fetch gist files, None if it is not modified since ``etag``"""
+    # Anonymous calls share 60 requests an hour, too few for the refreshes
+    auth = {'Authorization': f'token {_get_or_create_token()}'}
+    headers = {**auth, 'Accept': 'application/vnd.github.v3+json'}
+    if etag:
+        headers['If-None-Match'] = etag
 
-def get_gist(gist_id: str) -> github.Gist.Gist:
-    anon_client = get_client(anon=True)
     try:
-        return anon_client.get_gist(gist_id)
-    except github.GithubException as exc:
+        with metrics.api_call('github', 'get_gist'):
+            resp = requests.get(
+                f'https://api.github.com/gists/{gist_id}',
+                headers=headers,
+                timeout=settings.GITHUB_TIMEOUT,
+            )
+            if resp.status_code == 304:
+                return None
+            resp.raise_for_status()
+
+        data = resp.json()
+        with futures.ThreadPoolExecutor(
+            max_workers=GIST_DOWNLOAD_WORKERS
+        ) as executor:
+            contents = executor.map(
+                functools.partial(_get_gist_file_content, auth),
+                data['files'].values(),
+            )
+            files = dict(zip(data['files'], contents))
+    except requests.RequestException as exc:
         logger.exception(exc)
         raise exceptions.BackendException('GitHub exception: ' + str(exc))
 
+    history = data.get('history') or [{'version': data['updated_at']}]
+
+    return GistSnapshot(
+        revision=history[0]['version'],
+        etag=resp.headers.get('ETag'),
+        files=files,
+    )
+
+
+class _PayloadRepr:
+    _repr = reprlib.Repr()
+    _repr.maxlevel = 3
+    _repr.maxdict = 10
+    _repr.maxlist = 3
+    _repr.maxstring = 80
+
+    def __init__(self, payload: dict):
+        self.payload = payload
+
+    def __str__(self) -> str:
+        return self._repr.repr(self.payload)[:PAYLOAD_LOG_LIMIT]
+
 
 class EventDispatcher:
     def __init__(self):
@@ -218,10 +394,44 @@ class EventDispatcher:
             gh_events.ReviewHandler(),
         ]
 
-    def dispatch(self, headers: dict, payload: dict) -> None:
-        logger.debug('headers: %s, payload: %s', headers, payload)
+        # X-GitHub-Event -> action -> handlers
+        routes = collections.defaultdict(dict)
+        for handler in self.handlers:
+            for event, action in handler.events:
+                routes[event].setdefault(action, []).append(handler)
+        self.routes = dict(routes)
 
+        # X-GitHub-Event -> payload fields to parse
+        self.fields = collections.defaultdict(set)
         for handler in self.handlers:
-            if handler.is_acceptable(headers, payload):
-                logger.info('%s is acceptable. Handle...', handler)
-                handler.handle(headers, payload)
+            for event, fields in handler.fields.items():
+                self.fields[event].update(fields)
+        self.fields = dict(self.fields)
+
+    def is_supported(self, headers: dict) -> bool:
+        return headers.get(GITHUB_EVENT_HEADER) in self.routes
+
+    def get_fields(self, headers: dict) -> tp.Set[str]:
+        return self.fields.get(headers.get(GITHUB_EVENT_HEADER), set())
+
+    def resolve(
+        self, headers: dict, payload: dict
+    ) -> tp.List[gh_events.BaseEventHandler]:
+        actions = self.routes.get(headers.get(GITHUB_EVENT_HEADER))
+
+        if not actions:
+            return []
+
+        return actions.get(payload.get('action'), []) + actions.get(None, [])
+
+    def dispatch(self, headers: dict, payload: dict) -> None:
+        logger.debug(
+            'GitHub delivery: %s, event: %s, payload: %s',
+            headers.get(GITHUB_DELIVERY_HEADER),
+            headers.get(GITHUB_EVENT_HEADER),
+            _PayloadRepr(payload),
+        )
+
+        for handler in self.resolve(headers, payload):
+            logger.info('%s is acceptable. Handle...', handler)
+            handler.handle(headers, payload)
@@ -2,8 +2,8 @@ import abc
 import logging
 import typing as tp
 
-from bot import models
 from bot import tasks
+from bot.logic import routing
 
 
 logger = logging.getLogger(__name__)
@@ -13,9 +13,11 @@ COMMANDS = {'/accepted', '/needwork'}
 
 
 class BaseEventHandler(metaclass=abc.ABCMeta):
-    @abc.abstractmethod
-    def is_acceptable(self, headers: dict, payload: dict) -> bool:
-        raise NotImplementedError
+    # Pairs of (X-GitHub-Event, action) to handle. None action matches any
+    events: tp.Tuple[tp.Tuple[str, tp.Optional[str]], ...] = ()
+
+    # X-GitHub-Event -> payload fields read by handle()
+    fields: tp.Dict[str, tp.Set[str]] = {}
 
     @abc.abstractmethod
     def handle(self, headers: dict, payload: dict) -> None:
@@ -23,8 +25,24 @@ class BaseEventHandler(metaclass=abc.ABCMeta):
 
 
 class CommentHandler(BaseEventHandler):
-    def is_acceptable(self, headers: dict, payload: dict) -> bool:
-        return 'comment' in payload
+    events = (
+        ('issue_comment', 'created'),
+        ('pull_request_review_comment', 'created'),
+    )
+    fields = {
+        'issue_comment': {
+            'action',
+            'issue.html_url',
+            'comment.body',
+            'comment.user.login',
+        },
+        'pull_request_review_comment': {
+            'action',
+            'pull_request.html_url',
+            'comment.body',
+            'comment.user.login',
+        },
+    }
 
     def handle(self, headers: dict, payload: dict) -> None:
         pull = payload.get('issue') or payload.get('pull_request')
@@ -33,39 +51,34 @@ class CommentHandler(BaseEventHandler):
             logger.warning('No issue or pull_request field. Exit')
             return
 
-        if payload.get('action') != 'created':
-            logger.info('Action %s != created. Exit', payload.get('action'))
-            return
-
-        submission = models.Submission.objects.filter(
-            pull_url=pull['html_url']
-        ).first()
+        submission_id = routing.get_submission_id_by_pull_url(
+            pull['html_url']
+        )
 
-        if not submission:
+        if not submission_id:
             logger.info('No submission for pull: %s. Exit', pull['html_url'])
             return
 
         comment = payload['comment']['body']
         author = payload['comment']['user']['login']
 
-        user = models.BotUser.objects.filter(
-            github_login__iexact=author
-        ).first()
+        user = routing.get_user_by_github_login(author)
 
         if not user:
-            logger.info('Unregistered user: %s. Exit', user)
+            logger.info('Unregistered user: %s. Exit', author)
+            return
 
         if comment in COMMANDS and user.is_staff:
-            self._process_command(comment, payload, submission, user)
+            self._process_command(comment, payload, submission_id, user)
         else:
-            self._process_text(comment, payload, submission, user)
+            self._process_text(comment, payload, submission_id, user)
 
     def _process_text(
         self,
         text: str,
         payload: dict,
-        submission: models.Submission,
-        commenter: models.BotUser,
+        submission_id: int,
+        commenter: routing.UserRoute,
     ) -> None:
         if commenter.is_staff:
             logger.info('Some comments from staff. Waiting for commands')
@@ -76,47 +89,47 @@ class CommentHandler(BaseEventHandler):
             return
 
         tasks.process_student_pull_comment.delay(
-            submission.id, commenter.id, text[:100]
+            submission_id, commenter.id, text[:100]
         )
 
     def _process_command(
         self,
         command: str,
         payload: dict,
-        submission: models.Submission,
-        commenter: models.BotUser,
+        submission_id: int,
+        commenter: routing.UserRoute,
     ) -> None:
         if command == '/needwork':
-            self._needwork_command(payload, submission, commenter)
+            self._needwork_command(payload, submission_id, commenter)
         elif command == '/accepted':
-            self._accepted_command(payload, submission, commenter)
+            self._accepted_command(payload, submission_id, commenter)
 
     def _needwork_command(
         self,
         payload: dict,
-        submission: models.Submission,
-        commenter: models.BotUser,
+        submission_id: int,
+        commenter: routing.UserRoute,
     ) -> None:
         if not commenter.is_staff:
             logger.info('User: %s is not staff. Exit', commenter)
 
-        tasks.process_needwork.delay(submission.id)
+        tasks.process_needwork.delay(submission_id, reviewer_id=commenter.id)
 
     def _accepted_command(
         self,
         payload: dict,
-        submission: models.Submission,
-        commenter: models.BotUser,
+        submission_id: int,
+        commenter: routing.UserRoute,
     ) -> None:
         if not commenter.is_staff:
             logger.info('User: %s is not staff. Exit', commenter)
 
-        tasks.process_accepted.delay(submission.id, commenter.id)
+        tasks.process_accepted.delay(submission_id, commenter.id)
 
 
 class PushHandler(BaseEventHandler):
-    def is_acceptable(self, headers: dict, payload: dict) -> bool:
-        return headers.get('HTTP_X_GITHUB_EVENT') == 'push'
+    events = (('push', None),)
+    fields = {'push': {'ref', 'repository.name', 'pusher.name'}}
 
     def handle(self, headers: dict, payload: dict) -> None:
         logger.info(
@@ -125,52 +138,53 @@ class PushHandler(BaseEventHandler):
             payload['repository']['name'],
         )
 
-        submission = models.Submission.objects.filter(
-            git_ref=payload['ref'],
-            repository__name=payload['repository']['name'],
-        ).first()
+        submission_id = routing.get_submission_id_by_git_ref(
+            payload['repository']['name'], payload['ref']
+        )
 
-        logger.info('Found submission: %s', submission)
+        logger.info('Found submission: %s', submission_id)
 
-        if not submission:
+        if not submission_id:
             return
 
-        pusher = models.BotUser.objects.filter(
-            github_login__iexact=payload['pusher']['name']
-        ).first()
+        pusher = routing.get_user_by_github_login(payload['pusher']['name'])
 
         if not pusher:
-            logger.info('Unregistered pusher: %s. Exit', pusher)
+            logger.info(
+                'Unregistered pusher: %s. Exit', payload['pusher']['name']
+            )
             return
 
         if not pusher.is_staff:
-            tasks.process_student_push.delay(submission.id, pusher.id)
+            tasks.process_student_push.delay(submission_id, pusher.id)
 
 
 class ReviewHandler(BaseEventHandler):
-    def is_acceptable(self, headers: dict, payload: dict) -> bool:
-        return (
-            'review' in payload
-            and 'pull_request' in payload
-            and payload.get('action') == 'submitted'
-        )
+    events = (('pull_request_review', 'submitted'),)
+    fields = {
+        'pull_request_review': {
+            'action',
+            'pull_request.html_url',
+            'review.state',
+            'review.body',
+            'review.user.login',
+        }
+    }
 
     def handle(self, headers: dict, payload: dict) -> None:
         pull = payload['pull_request']
 
-        submission = models.Submission.objects.filter(
-            pull_url=pull['html_url']
-        ).first()
+        submission_id = routing.get_submission_id_by_pull_url(
+            pull['html_url']
+        )
 
-        if not submission:
+        if not submission_id:
             logger.info('No submission for pull: %s. Exit', pull['html_url'])
             return
 
         review = payload['review']
 
-        user = models.BotUser.objects.filter(
-            github_login__iexact=review['user']['login']
-        ).first()
+        user = routing.get_user_by_github_login(review['user']['login'])
 
         if not user:
             logger.info('Unregistered user: %s. Exit', review['user']['login'])
@@ -184,28 +198,28 @@ class ReviewHandler(BaseEventHandler):
 
         if state == 'changes_requested':
             logger.info('Processing needwork')
-            tasks.process_needwork.delay(submission.id)
+            tasks.process_needwork.delay(submission_id, reviewer_id=user.id)
         elif state == 'approved':
             logger.info('Processing accepted')
-            tasks.process_accepted.delay(submission.id, user.id)
+            tasks.process_accepted.delay(submission_id, user.id)
         elif state == 'commented':
             logger.info('Processing comment')
-            self._proccess_comment(review.get('body'), submission, user)
+            self._proccess_comment(review.get('body'), submission_id, user)
         else:
             logger.info('Unsupported review state: %s', state)
 
     def _proccess_comment(
         self,
         comment: tp.Optional[str],
-        submission: models.Submission,
-        user: models.BotUser,
+        submission_id: int,
+        user: routing.UserRoute,
     ) -> None:
         if not comment:
             logger.info('Comment is empty. Exit...')
             return
         if comment == '/needwork':
-            tasks.process_needwork.delay(submission.id)
+            tasks.process_needwork.delay(submission_id, reviewer_id=user.id)
         elif comment == '/accepted':
-            tasks.process_accepted.delay(submission.id, user.id)
+            tasks.process_accepted.delay(submission_id, user.id)
         else:
             logger.info('Comment is just text. Exit...')
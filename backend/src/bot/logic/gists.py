@@ -0,0 +1,208 @@
+import dataclasses
+import logging
+import re
+import typing as tp
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max
+
+from bot import models
+from bot.logic import gh
+
+
+logger = logging.getLogger(__name__)
+
+TASK_FILENAME_PATTERN = re.compile(r'([0-9]+)\.md')
+
+REVISION_TIMEOUT = 60
+
+CONTENT_TIMEOUT = 24 * 60 * 60
+
+
+def _revision_key(gist_id: str) -> str:
+    return f'gists:revision:{gist_id}'
+
+
+def _content_key(gist_id: str, revision: str, task_id: int) -> str:
+    return f'gists:content:{gist_id}:{revision}:{task_id}'
+
+
+def get_revision(gist_id: str) -> tp.Optional[str]:
+    key = _revision_key(gist_id)
+    revision = cache.get(key)
+
+    if revision is None:
+        revision = (
+            models.GistRevision.objects.filter(gist_id=gist_id)
+            .values_list('revision', flat=True)
+            .first()
+        )
+        if revision is not None:
+            cache.set(key, revision, REVISION_TIMEOUT)
+
+    return revision
+
+
+def get_task_content(gist_id: str, task_id: int) -> tp.Optional[str]:
+    # Content is keyed by revision, so a refreshed gist is picked up as soon
+    # as the short-lived revision entry expires
+    revision = get_revision(gist_id)
+    if revision is None:
+        refresh_gist(gist_id)
+        revision = get_revision(gist_id)
+
+    key = _content_key(gist_id, revision, task_id)
+    content = cache.get(key)
+
+    if content is None:
+        content = (
+            models.AssignmentGistCache.objects.filter(
+                gist_id=gist_id, task_id=task_id
+            )
+            .values_list('content', flat=True)
+            .first()
+        )
+        if content is not None:
+            cache.set(key, content, CONTENT_TIMEOUT)
+
+    return content
+
+
+@dataclasses.dataclass
+class GistRefresh:
+    changed: bool
+    errors: tp.Dict[str, str] = dataclasses.field(default_factory=dict)
+
+
+def parse_tasks(
+    files: tp.Dict[str, str]
+) -> tp.Tuple[tp.Dict[int, str], tp.Dict[str, str]]:
+    """Split gist files into task texts and errors of skipped files"""
+    tasks = {}
+    errors = {}
+
+    for filename, content in sorted(files.items()):
+        match = TASK_FILENAME_PATTERN.match(filename)
+        if not match:
+            errors[filename] = 'имя файла должно быть вида <номер>.md'
+        elif not content.strip():
+            errors[filename] = 'файл пустой'
+        elif int(match.group(1)) in tasks:
+            errors[filename] = f'задача {int(match.group(1))} уже есть'
+        else:
+            tasks[int(match.group(1))] = content
+
+    for filename, error in errors.items():
+        logger.warning('Bad file %s in gist: %s', filename, error)
+
+    return tasks, errors
+
+
+def get_task_ids(gist_id: str) -> tp.List[int]:
+    return list(
+        models.AssignmentGistCache.objects.filter(gist_id=gist_id)
+        .order_by('task_id')
+        .values_list('task_id', flat=True)
+    )
+
+
+def _update_assignments(gist_id: str, task_ids: tp.List[int]) -> None:
+    assignments = models.Assignment.objects.filter(
+        gist_url__contains=gist_id
+    ).values_list('id', 'gist_url')
+
+    models.Assignment.objects.filter(
+        id__in=[
+            assignment_id
+            for assignment_id, gist_url in assignments
+            if models.AssignmentGistCache.parse_gist_url(gist_url) == gist_id
+        ]
+    ).update(task_ids=task_ids, tasks_count=len(task_ids))
+
+
+def refresh_gist(gist_id: str, force: bool = False) -> GistRefresh:
+    """Store the latest gist revision if it differs from the stored one"""
+    current = models.GistRevision.objects.filter(gist_id=gist_id).first()
+
+    etag = current.etag if current is not None and not force else None
+    snapshot = gh.fetch_gist(gist_id, etag)
+
+    if snapshot is None:
+        logger.info('Gist %s is not modified', gist_id)
+        return GistRefresh(changed=False)
+
+    if current is not None and current.revision == snapshot.revision:
+        models.GistRevision.objects.filter(id=current.id).update(
+            etag=snapshot.etag
+        )
+        return GistRefresh(changed=False)
+
+    tasks, errors = parse_tasks(snapshot.files)
+
+    logger.info(
+        'Storing gist %s revision %s: %s tasks',
+        gist_id,
+        snapshot.revision,
+        len(tasks),
+    )
+
+    with transaction.atomic():
+        models.AssignmentGistCache.objects.filter(gist_id=gist_id).exclude(
+            task_id__in=tasks
+        ).delete()
+
+        for task_id, content in tasks.items():
+            models.AssignmentGistCache.objects.update_or_create(
+                gist_id=gist_id,
+                task_id=task_id,
+                defaults={'content': content, 'revision': snapshot.revision},
+            )
+
+        models.GistRevision.objects.update_or_create(
+            gist_id=gist_id,
+            defaults={'revision': snapshot.revision, 'etag': snapshot.etag},
+        )
+
+        _update_assignments(gist_id, sorted(tasks))
+
+    cache.set(_revision_key(gist_id), snapshot.revision, REVISION_TIMEOUT)
+
+    return GistRefresh(changed=True, errors=errors)
+
+
+def create_assignment(
+    gist_url: str,
+    group_id: int,
+    assignment_type: str,
+    assignment_name: str,
+    owner_id: int,
+) -> tp.Tuple[tp.Optional[models.Assignment], tp.Dict[str, str]]:
+    """Import the gist and create a disabled assignment from it
+
+    Returns no assignment when the gist has no valid tasks.
+    """
+    gist_id = models.AssignmentGistCache.parse_gist_url(gist_url)
+
+    refresh = refresh_gist(gist_id)
+    task_ids = get_task_ids(gist_id)
+
+    if not task_ids:
+        return None, refresh.errors
+
+    last_seq = models.Assignment.objects.filter(
+        group_id=group_id, type=assignment_type
+    ).aggregate(Max('seq'))['seq__max']
+
+    assignment = models.Assignment.objects.create(
+        group_id=group_id,
+        name=assignment_name,
+        gist_url=gist_url,
+        type=assignment_type,
+        owner_id=owner_id,
+        seq=last_seq + 1 if last_seq is not None else 1,
+        task_ids=task_ids,
+        tasks_count=len(task_ids),
+    )
+
+    return assignment, refresh.errors
@@ -5,7 +5,7 @@ import typing as tp
 
 import telegram as tg
 from django.conf import settings
-from django.db.models import Max, Count
+from django.db.models import Count
 from telegram import ext as tg_ext
 from telegram.ext import (
     CallbackQueryHandler,
@@ -15,10 +15,11 @@ from telegram.ext import (
     MessageHandler,
 )
 
-from app import exceptions
+from app import metrics
+from app import tracing
 from bot import models
 from bot import tasks as celery_tasks
-from bot.logic import gh, helpers
+from bot.logic import helpers, keyboards, user_context
 
 logger = logging.getLogger(__name__)
 
@@ -42,18 +43,18 @@ logger = logging.getLogger(__name__)
 
 
 def _reply_commands_list(
-    user: models.BotUser, message: str, callback: tp.Callable
+    user_ctx: user_context.UserContext, message: str, callback: tp.Callable
 ) -> None:
-    commands = helpers.get_user_commands(user)
-    callback(message, helpers.inline_keyboard(commands, 'known'))
+    callback(message, keyboards.get_commands_keyboard(user_ctx))
 
 
+@tracing.traced
 def start_cancel_command(update: tg.Update, context: tg_ext.CallbackContext):
-    user = models.BotUser.get_or_none(update.effective_chat.id)
+    user_ctx = user_context.for_update(update)
 
-    if user:
+    if user_ctx:
         _reply_commands_list(
-            user,
+            user_ctx,
             helpers.get_message('start_to_do'),
             lambda m, kb: context.bot.send_message(
                 update.effective_chat.id, m, reply_markup=kb
@@ -61,25 +62,28 @@ def start_cancel_command(update: tg.Update, context: tg_ext.CallbackContext):
         )
         return KNOWN
 
-    groups = models.Groups.objects.order_by('name')
-
     context.bot.send_message(
         update.effective_chat.id,
         helpers.get_message('from_what_group'),
-        reply_markup=helpers.inline_keyboard(
-            groups,
-            prefix='group_requested',
-            alias_col='id',
-            column=False,
+        reply_markup=keyboards.get_keyboard(
+            'group_requested',
+            lambda: helpers.inline_keyboard(
+                models.Groups.objects.order_by('name'),
+                prefix='group_requested',
+                alias_col='id',
+                column=False,
+            ),
+            data=[keyboards.GROUPS],
         ),
     )
 
     return GROUP_REQUESTED
 
 
+@tracing.traced
 def me_command(update: tg.Update, context: tg_ext.CallbackContext):
     tg_user = update.effective_user
-    user = models.BotUser.get_or_none(update.effective_chat.id)
+    user_ctx = user_context.for_update(update)
 
     msg_alias = 'me_response'
     kwargs = {
@@ -88,15 +92,16 @@ def me_command(update: tg.Update, context: tg_ext.CallbackContext):
         'tg_id': tg_user.id,
     }
 
-    if user:
+    if user_ctx:
         msg_alias = 'me_response_known'
+        groups = models.Groups.objects.filter(id__in=user_ctx.group_ids)
         kwargs.update(
             {
                 'groups': ','.join(
-                    helpers.escape_markdown(g.name) for g in user.groups.all()
+                    helpers.escape_markdown(g.name) for g in groups
                 ),
-                'github_login': user.github_login,
-                'full_name': user.full_name,
+                'github_login': user_ctx.user.github_login,
+                'full_name': user_ctx.user.full_name,
             }
         )
 
@@ -106,6 +111,7 @@ def me_command(update: tg.Update, context: tg_ext.CallbackContext):
     )
 
 
+@tracing.traced
 def group_selected_callback(
     update: tg.Update, context: tg_ext.CallbackContext
 ):
@@ -141,6 +147,7 @@ def group_selected_callback(
     return NAME_REQUESTED
 
 
+@tracing.traced
 def name_selected_callback(update: tg.Update, context: tg_ext.CallbackContext):
     query = update.callback_query
 
@@ -155,45 +162,34 @@ def name_selected_callback(update: tg.Update, context: tg_ext.CallbackContext):
     return GITHUN_LOGIN_REQUESTED
 
 
+@tracing.traced
 def github_login_callback(update: tg.Update, context: tg_ext.CallbackContext):
-    github_login = update.message.text
+    user_ctx = user_context.for_update(update)
 
-    wait_msg = update.message.reply_text('Секундочку. Проверяю...')
-
-    try:
-        if not gh.is_github_user(github_login):
-            wait_msg.edit_text(
-                helpers.get_message(
-                    'no_github_account', github_login=github_login
-                ),
-                parse_mode=tg.ParseMode.MARKDOWN_V2,
-            )
-            return GITHUN_LOGIN_REQUESTED
-    except exceptions.BackendException:
-        wait_msg.edit_text(
-            helpers.get_message('cannot_chech_github'),
+    # Text after a finished registration is not another login
+    if user_ctx:
+        _reply_commands_list(
+            user_ctx,
+            helpers.get_message('start_to_do'),
+            lambda m, kb: update.message.reply_text(m, reply_markup=kb),
         )
-        return GITHUN_LOGIN_REQUESTED
-
-    user = models.BotUser.objects.get(id=context.user_data['user_id'])
-
-    user.telegram_chat_id = update.effective_chat.id
-    user.github_login = github_login
-
-    if update.effective_user.username:
-        user.telegram_login = update.effective_user.username
+        return KNOWN
 
-    user.save()
+    wait_msg = update.message.reply_text('Секундочку. Проверяю...')
 
-    _reply_commands_list(
-        user,
-        helpers.get_message('welcome_to_do'),
-        lambda m, kb: wait_msg.edit_text(m, reply_markup=kb),
+    # Replies by editing wait_msg, known commands are accepted afterwards
+    celery_tasks.register_github_login.delay(
+        wait_msg.chat_id,
+        wait_msg.message_id,
+        int(context.user_data['user_id']),
+        update.message.text,
+        update.effective_user.username,
     )
 
-    return start_cancel_command(update, context)
+    return GITHUN_LOGIN_REQUESTED
 
 
+@tracing.traced
 def upload_assignment_callback(
     assignment_type: models.AssignmentType,
     update: tg.Update,
@@ -201,15 +197,26 @@ def upload_assignment_callback(
 ):
     query = update.callback_query
 
-    user = models.BotUser.objects.get(
-        telegram_chat_id=update.effective_chat.id
-    )
+    user_ctx = user_context.for_update(update)
 
-    assignments = models.Assignment.get_available_for_user(
-        user, assignment_type
+    def _build_keyboard():
+        assignments = models.Assignment.get_available_for_groups(
+            user_ctx.group_ids, assignment_type
+        )
+        if not assignments:
+            return None
+        return helpers.inline_keyboard(
+            assignments, 'wait_select_assignment', alias_col='id'
+        )
+
+    keyboard = keyboards.get_keyboard(
+        f'assignments_{assignment_type.value}',
+        _build_keyboard,
+        groups=user_ctx.group_ids,
+        data=[keyboards.ASSIGNMENTS],
     )
 
-    if not assignments:
+    if keyboard is None:
         query.edit_message_text(helpers.get_message('no_assignments'))
         query.answer()
         return start_cancel_command(update, context)
@@ -219,10 +226,7 @@ def upload_assignment_callback(
     context.user_data['assignment_type'] = assignment_type.value
 
     query.edit_message_text(
-        helpers.get_message(msg_alias),
-        reply_markup=helpers.inline_keyboard(
-            assignments, 'wait_select_assignment', alias_col='id'
-        ),
+        helpers.get_message(msg_alias), reply_markup=keyboard
     )
 
     query.answer()
@@ -230,14 +234,13 @@ def upload_assignment_callback(
     return WAIT_SELECT_ASSIGNMENT
 
 
+@tracing.traced
 def assignment_selected_callback(
     update: tg.Update, context: tg_ext.CallbackContext
 ):
     query = update.callback_query
 
-    user = models.BotUser.objects.get(
-        telegram_chat_id=update.effective_chat.id
-    )
+    user = user_context.for_update(update).user
 
     assignment = models.Assignment.objects.get(
         id=helpers.extract_data(
@@ -265,6 +268,7 @@ def assignment_selected_callback(
     return WAIT_SELECT_ASSIGNMENT_TASK
 
 
+@tracing.traced
 def assignment_task_selected_callback(
     update: tg.Update, context: tg_ext.CallbackContext
 ):
@@ -281,6 +285,7 @@ def assignment_task_selected_callback(
     return WAIT_FILE
 
 
+@tracing.traced
 def document_uploaded(update: tg.Update, context: tg_ext.CallbackContext):
     document = update.message.document
 
@@ -291,7 +296,8 @@ def document_uploaded(update: tg.Update, context: tg_ext.CallbackContext):
     wait_msg = update.message.reply_text(helpers.get_message('wait_a_second'))
 
     try:
-        objectkey = helpers.upload_file_to_s3(document.get_file())
+        with metrics.stage('upload'):
+            objectkey = helpers.upload_file_to_s3(document.get_file())
 
         user = models.BotUser.objects.get(id=context.user_data['user_id'])
         assignment = models.Assignment.objects.get(
@@ -317,10 +323,12 @@ def document_uploaded(update: tg.Update, context: tg_ext.CallbackContext):
     return ConversationHandler.END
 
 
+@tracing.traced
 def fallback_handler(update: tg.Update, context: tg_ext.CallbackContext):
     update.message.reply_text(helpers.get_message('fallback'))
 
 
+@tracing.traced
 def error_handler(update: tg.Update, context: tg_ext.CallbackContext):
     tb = ''.join(
         traceback.format_exception(
@@ -330,7 +338,8 @@ def error_handler(update: tg.Update, context: tg_ext.CallbackContext):
 
     logger.exception(context.error)
 
-    user = models.BotUser.get_or_none(update.effective_chat.id)
+    user_ctx = user_context.for_update(update)
+    user = user_ctx.user if user_ctx else None
 
     message = (
         f'Ошибка у пользователя: {user.full_name} '
@@ -344,51 +353,112 @@ def error_handler(update: tg.Update, context: tg_ext.CallbackContext):
     )
 
 
-def review_handler(update: tg.Update, context: tg_ext.CallbackContext):
-    user = models.BotUser.objects.get(
-        telegram_chat_id=update.effective_chat.id
+REVIEW_PAGE_SIZE = 50
+
+
+def _build_review_page(
+    groups: tp.List[int], after: tp.Optional[tp.Tuple[int, int, int]]
+) -> tp.Tuple[str, tp.Optional[tp.Tuple[int, int, int]]]:
+    submissions = models.Submission.get_review_page(
+        groups, after, limit=REVIEW_PAGE_SIZE + 1
     )
 
-    submissions = models.Submission.objects.filter(
-        author__groups__in=user.groups.all(),
-        status=models.SubmissionStatus.Review.value,
-    ).order_by('real_assignment__type', 'real_assignment__id', 'task_id')
+    if not submissions:
+        return 'Задач на review нет\\.', None
 
-    by_assignment = collections.defaultdict(list)
+    totals = dict(
+        models.Submission.get_for_review(groups)
+        .filter(
+            real_assignment__in={s.real_assignment_id for s in submissions}
+        )
+        .values_list('real_assignment')
+        .annotate(total=Count('id'))
+    )
 
-    limit = 50
+    msg = ''
+    last_key = None
+    last_assignment_id = last_task_id = None
+    counter = 1
+
+    for submission in submissions[:REVIEW_PAGE_SIZE]:
+        chunk = ''
+        if last_assignment_id != submission.real_assignment_id:
+            assignment_name = helpers.escape_markdown(
+                submission.real_assignment.name
+            )
+            total = totals.get(submission.real_assignment_id, 0)
+            if msg:
+                chunk += '\n'
+            chunk += f'*{assignment_name}* \\(review\\: {total}\\)\n\n'
+            counter = 1
+        elif last_task_id != submission.task_id:
+            chunk += '\n'
+            counter = 1
+
+        chunk += (
+            f'➜ {counter}\\. [Задача №{submission.task_id} / '
+            f'{helpers.escape_markdown(submission.author.full_name)}]'
+            f'({submission.pull_url})\n'
+        )
 
-    for submission in submissions:
-        by_assignment[submission.assignment.id].append(submission)
+        if len(msg) + len(chunk) > tg.MAX_MESSAGE_LENGTH:
+            return msg, last_key
 
-    for key in by_assignment:
-        by_assignment[key].sort(key=lambda s: (s.task_id, s.author.full_name))
+        msg += chunk
+        counter += 1
+        last_key = submission.review_page_key
+        last_assignment_id = submission.real_assignment_id
+        last_task_id = submission.task_id
 
-    for assignment_id, submissions in by_assignment.items():
-        assignment = models.Assignment.objects.get(id=assignment_id)
-        assignment_name = helpers.escape_markdown(assignment.name)
+    if len(submissions) > REVIEW_PAGE_SIZE:
+        return msg, last_key
 
-        msg = f'*{assignment_name}* \\(review\\: {len(submissions)}\\)\n\n'
+    return msg, None
 
-        last_task_id = None
 
-        counter = 1
-        for submission in submissions[:limit]:
-            if last_task_id is not None and last_task_id != submission.task_id:
-                msg += '\n'
-                counter = 1
-            last_task_id = submission.task_id
-            msg += (
-                f'➜ {counter}\\. [Задача №{submission.task_id} / '
-                f'{submission.author.full_name}]'
-                f'({submission.pull_url})\n'
-            )
-            counter += 1
+@tracing.traced
+def review_handler(update: tg.Update, context: tg_ext.CallbackContext):
+    query = update.callback_query
+
+    user_ctx = user_context.for_update(update)
+
+    after = None
+    if query.data.startswith('review_page'):
+        page_key = helpers.extract_data(query.data, 'review_page')
+        after = tuple(int(part) for part in page_key.split(':'))
+
+    msg, next_key = _build_review_page(list(user_ctx.group_ids), after)
+
+    reply_markup = None
+    if next_key is not None:
+        reply_markup = helpers.inline_keyboard(
+            [
+                {
+                    'name': 'Дальше ➜',
+                    'alias': ':'.join(str(part) for part in next_key),
+                }
+            ],
+            'review_page',
+        )
+
+    query.answer()
+
+    if after is None:
         context.bot.send_message(
-            update.effective_chat.id, msg, parse_mode=tg.ParseMode.MARKDOWN_V2
+            update.effective_chat.id,
+            msg,
+            parse_mode=tg.ParseMode.MARKDOWN_V2,
+            reply_markup=reply_markup,
+        )
+    else:
+        query.edit_message_text(
+            msg,
+            parse_mode=tg.ParseMode.MARKDOWN_V2,
+            reply_markup=reply_markup,
         )
 
 
+@tracing.traced
 def select_group_handler(
     update: tg.Update,
     context: tg_ext.CallbackContext,
@@ -397,34 +467,33 @@ def select_group_handler(
 ):
     query = update.callback_query
 
-    user = models.BotUser.get_or_none(update.effective_chat.id)
-
-    groups = user.groups.all()
+    group_ids = user_context.for_update(update).group_ids
 
-    if len(groups) == 0:
+    if len(group_ids) == 0:
         query.answer()
         query.edit_message_text(
             'Вы не привязаны ни к одной из групп. Обратитесь к администратору'
         )
         return ConversationHandler.END
 
-    if len(groups) > 1:
+    if len(group_ids) > 1:
         query.answer()
         query.edit_message_text(
             'Выберите группу?',
             reply_markup=helpers.inline_keyboard(
-                groups,
+                models.Groups.objects.filter(id__in=group_ids),
                 next_handler.__name__,
                 alias_col='id',
             ),
         )
         return next_state
 
-    context.user_data['group_id'] = groups[0].id
+    context.user_data['group_id'] = group_ids[0]
 
     return next_handler(update, context)
 
 
+@tracing.traced
 def group_for_new_assignment_selected(
     update: tg.Update, context: tg_ext.CallbackContext
 ):
@@ -452,6 +521,7 @@ def group_for_new_assignment_selected(
     return WAIT_ASSIGNMENT_TYPE_TO_CREATE
 
 
+@tracing.traced
 def assignment_type_for_create_selected(
     update: tg.Update, context: tg_ext.CallbackContext
 ):
@@ -477,6 +547,7 @@ def assignment_type_for_create_selected(
     return WAIT_ASSIGNMENT_NAME
 
 
+@tracing.traced
 def new_assignment_name_selected(
     update: tg.Update, context: tg_ext.CallbackContext
 ):
@@ -487,6 +558,7 @@ def new_assignment_name_selected(
     return WAIT_GIST
 
 
+@tracing.traced
 def new_assignment_gist_selected(
     update: tg.Update, context: tg_ext.CallbackContext
 ):
@@ -502,80 +574,31 @@ def new_assignment_gist_selected(
 
     wait_msg = update.message.reply_text('Секундочку. Скачиваю gist...')
 
-    try:
-        models.AssignmentGistCache.cache_gist(gist_id)
-    except exceptions.BackendException:
-        wait_msg.edit_text(
-            'Какой-то неправильный у вас gist. Попробуйте еще раз.'
-        )
-        return WAIT_GIST
-
-    tasks_count = models.AssignmentGistCache.objects.filter(
-        gist_id=gist_id
-    ).count()
-
-    if tasks_count == 0:
-        wait_msg.edit_text(
-            'Не смог найти ни одной задачи в вашем gist. Попробуйте другой.'
-        )
-        return WAIT_GIST
-
-    wait_msg.edit_text(f'Найдено задач: {tasks_count}')
-
-    group = models.Groups.objects.get(id=int(context.user_data['group_id']))
-    user = models.BotUser.get_or_none(update.effective_chat.id)
-
-    assignment_type = context.user_data['assignment_type']
-
-    last_seq = models.Assignment.objects.filter(
-        group=group, type=assignment_type
-    ).aggregate(Max('seq'))['seq__max']
-
-    assignment = models.Assignment.objects.create(
-        group=group,
-        name=context.user_data['assignment_name'],
-        gist_url=gist_url,
-        type=assignment_type,
-        owner=user,
-        seq=last_seq + 1 if last_seq is not None else 1,
+    celery_tasks.import_assignment_gist.delay(
+        wait_msg.chat_id,
+        wait_msg.message_id,
+        gist_url,
+        group_id=int(context.user_data['group_id']),
+        assignment_type=context.user_data['assignment_type'],
+        assignment_name=context.user_data['assignment_name'],
+        owner_id=user_context.for_update(update).user.id,
     )
 
-    update.message.reply_text(
-        helpers.get_message(
-            'assignment_created',
-            assignment_type=assignment.type,
-            assignment_name=assignment.name,
-            assignment_seq=assignment.seq,
-            group_name=group.name,
-            tasks_count=tasks_count,
-            gist_url=gist_url,
-        ),
-        parse_mode=tg.ParseMode.MARKDOWN_V2,
-        reply_markup=helpers.inline_keyboard(
-            [
-                {'name': 'Да', 'alias': 'true'},
-                {'name': 'Нет', 'alias': 'false'},
-            ],
-            'wait_enable_assignment',
-            column=False,
-        ),
-    )
-
-    context.user_data['assignment_id'] = assignment.id
-
     return WAIT_ENABLE_ASSIGNMENT
 
 
+@tracing.traced
 def enable_assignment(update: tg.Update, context: tg_ext.CallbackContext):
     query = update.callback_query
-    enable = helpers.extract_data(query.data, 'wait_enable_assignment')
+    data = helpers.extract_data(query.data, 'wait_enable_assignment')
+    assignment_id, _, enable = data.rpartition(':')
 
     query.answer()
     query.edit_message_reply_markup(None)
 
     if enable == 'true':
         assignment = models.Assignment.objects.get(
-            id=int(context.user_data['assignment_id'])
+            id=int(assignment_id or context.user_data['assignment_id'])
         )
         assignment.is_enabled = True
         assignment.save()
@@ -584,6 +607,7 @@ def enable_assignment(update: tg.Update, context: tg_ext.CallbackContext):
     return ConversationHandler.END
 
 
+@tracing.traced
 def group_for_assignments_list_selected(
     update: tg.Update, context: tg_ext.CallbackContext
 ):
@@ -625,10 +649,13 @@ def group_for_assignments_list_selected(
     return SELECT_ASSIGNMENT_TO_MANAGE
 
 
-def _create_assignment_commands(assignment: models.Assignment):
-    on_review = models.Submission.objects.filter(
-        real_assignment=assignment, status=models.SubmissionStatus.Review.value
-    ).count()
+def _create_assignment_commands(
+    assignment: models.Assignment,
+    counts: tp.Optional[tp.Dict[str, int]] = None,
+):
+    if counts is None:
+        counts = models.AssignmentStats.get_counts(assignment.id)
+    on_review = counts.get(models.SubmissionStatus.Review.value, 0)
 
     commands = [
         {
@@ -645,6 +672,8 @@ def _create_assignment_commands(assignment: models.Assignment):
             }
         )
 
+    commands.append({'name': 'Обновить gist 🔄', 'alias': 'refresh_gist'})
+
     return commands
 
 
@@ -656,6 +685,7 @@ class CountByStatus:
         return self.status_count_map.get(name, 0)
 
 
+@tracing.traced
 def select_assignment_to_manage_handler(
     update: tg.Update, context: tg_ext.CallbackContext
 ):
@@ -667,15 +697,7 @@ def select_assignment_to_manage_handler(
 
     context.user_data['assignment_id'] = assignment.id
 
-    assignment_submissions = models.Submission.objects.filter(
-        real_assignment=assignment
-    )
-    submissions_statuses = {
-        item['status']: item['total']
-        for item in assignment_submissions.values('status').annotate(
-            total=Count('status')
-        )
-    }
+    submissions_statuses = models.AssignmentStats.get_counts(assignment.id)
 
     query.edit_message_text(
         helpers.get_message(
@@ -689,7 +711,7 @@ def select_assignment_to_manage_handler(
             by_status=CountByStatus(submissions_statuses),
         ),
         reply_markup=helpers.inline_keyboard(
-            _create_assignment_commands(assignment),
+            _create_assignment_commands(assignment, submissions_statuses),
             'manage_assignments',
         ),
         parse_mode=tg.ParseMode.MARKDOWN_V2,
@@ -698,10 +720,31 @@ def select_assignment_to_manage_handler(
     return WAIT_COMMAND_FOR_ASSIGNMENT
 
 
+@tracing.traced
+def refresh_assignment_gist(
+    update: tg.Update, context: tg_ext.CallbackContext
+):
+    user = user_context.for_update(update).user
+    query = update.callback_query
+
+    assignment = models.Assignment.objects.get(
+        id=int(context.user_data['assignment_id'])
+    )
+
+    if assignment.owner == user:
+        celery_tasks.refresh_gist.delay(
+            models.AssignmentGistCache.parse_gist_url(assignment.gist_url)
+        )
+        query.answer('Gist обновится в течение минуты')
+    else:
+        query.answer('Только создатели ассайнмента могут его изменять')
+
+
+@tracing.traced
 def toogle_enable_assignment(
     update: tg.Update, context: tg_ext.CallbackContext
 ):
-    user = models.BotUser.get_or_none(update.effective_user.id)
+    user = user_context.for_update(update).user
     query = update.callback_query
 
     assignment = models.Assignment.objects.get(
@@ -728,6 +771,7 @@ def toogle_enable_assignment(
     return WAIT_COMMAND_FOR_ASSIGNMENT
 
 
+@tracing.traced
 def show_review_submissions(
     update: tg.Update, context: tg_ext.CallbackContext
 ):
@@ -738,10 +782,14 @@ def show_review_submissions(
         id=int(context.user_data['assignment_id'])
     )
 
-    submissions = models.Submission.objects.filter(
-        real_assignment=assignment,
-        status=models.SubmissionStatus.Review.value,
-    ).order_by('task_id', 'author__last_name', 'author__first_name')
+    submissions = (
+        models.Submission.objects.filter(
+            real_assignment=assignment,
+            status=models.SubmissionStatus.Review.value,
+        )
+        .select_related('author')
+        .order_by('task_id', 'author__last_name', 'author__first_name')
+    )
 
     by_task_id = collections.defaultdict(list)
 
@@ -786,44 +834,47 @@ def show_review_submissions(
 
 
 def setup_handlers(dispatcher: tg_ext.Dispatcher):
+    known_handlers = [
+        CallbackQueryHandler(
+            lambda upd, ctx: upload_assignment_callback(
+                models.AssignmentType.Homework, upd, ctx
+            ),
+            pattern='^known:upload_homework$',
+        ),
+        CallbackQueryHandler(
+            lambda upd, ctx: upload_assignment_callback(
+                models.AssignmentType.Test, upd, ctx
+            ),
+            pattern='^known:upload_test$',
+        ),
+        CallbackQueryHandler(review_handler, pattern='^known:review$'),
+        CallbackQueryHandler(review_handler, pattern='^review_page:'),
+        CallbackQueryHandler(
+            lambda upd, ctx: select_group_handler(
+                upd,
+                ctx,
+                WAIT_SELECT_GROUP_FOR_NEW_ASSIGNMENT,
+                group_for_new_assignment_selected,
+            ),
+            pattern='^known:create_assignment$',
+        ),
+        CallbackQueryHandler(
+            lambda upd, ctx: select_group_handler(
+                upd,
+                ctx,
+                WAIT_SELECT_GROUP_FOR_ASSIGNMENTS_LIST,
+                group_for_assignments_list_selected,
+            ),
+            pattern='^known:view_assignments$',
+        ),
+    ]
+
     conversation = ConversationHandler(
         entry_points=[
             CommandHandler(['cancel', 'start'], start_cancel_command),
         ],
         states={
-            KNOWN: [
-                CallbackQueryHandler(
-                    lambda upd, ctx: upload_assignment_callback(
-                        models.AssignmentType.Homework, upd, ctx
-                    ),
-                    pattern='^known:upload_homework$',
-                ),
-                CallbackQueryHandler(
-                    lambda upd, ctx: upload_assignment_callback(
-                        models.AssignmentType.Test, upd, ctx
-                    ),
-                    pattern='^known:upload_test$',
-                ),
-                CallbackQueryHandler(review_handler, pattern='^known:review$'),
-                CallbackQueryHandler(
-                    lambda upd, ctx: select_group_handler(
-                        upd,
-                        ctx,
-                        WAIT_SELECT_GROUP_FOR_NEW_ASSIGNMENT,
-                        group_for_new_assignment_selected,
-                    ),
-                    pattern='^known:create_assignment$',
-                ),
-                CallbackQueryHandler(
-                    lambda upd, ctx: select_group_handler(
-                        upd,
-                        ctx,
-                        WAIT_SELECT_GROUP_FOR_ASSIGNMENTS_LIST,
-                        group_for_assignments_list_selected,
-                    ),
-                    pattern='^known:view_assignments$',
-                ),
-            ],
+            KNOWN: known_handlers,
             GROUP_REQUESTED: [
                 CallbackQueryHandler(
                     group_selected_callback, pattern='^group_requested'
@@ -838,6 +889,7 @@ def setup_handlers(dispatcher: tg_ext.Dispatcher):
                 MessageHandler(
                     Filters.text & ~Filters.command, github_login_callback
                 ),
+                *known_handlers,
             ],
             WAIT_SELECT_ASSIGNMENT: [
                 CallbackQueryHandler(
@@ -880,7 +932,12 @@ def setup_handlers(dispatcher: tg_ext.Dispatcher):
                 CallbackQueryHandler(
                     enable_assignment,
                     pattern='^wait_enable_assignment',
-                )
+                ),
+                # Import failed: the teacher sends another gist
+                MessageHandler(
+                    Filters.text & ~Filters.command,
+                    new_assignment_gist_selected,
+                ),
             ],
             WAIT_SELECT_GROUP_FOR_ASSIGNMENTS_LIST: [
                 CallbackQueryHandler(
@@ -903,6 +960,10 @@ def setup_handlers(dispatcher: tg_ext.Dispatcher):
                     show_review_submissions,
                     pattern='^manage_assignments:review_submissions',
                 ),
+                CallbackQueryHandler(
+                    refresh_assignment_gist,
+                    pattern='^manage_assignments:refresh_gist',
+                ),
             ],
         },
         fallbacks=[
@@ -1,72 +1,152 @@
 import datetime
+import functools
 import logging
+import os
 import typing as tp
 import uuid
 
 from django.conf import settings
+from django.core.cache import cache
 from telegram import File, InlineKeyboardButton, InlineKeyboardMarkup
 import boto3
-from telegram.utils import helpers as telegram_helpers
 
 from bot import models
 
 
 logger = logging.getLogger(__name__)
 
+MESSAGES_DIR = os.path.join(os.path.dirname(__file__), 'messages')
+
+DEFAULT_MESSAGES = {
+    'start_to_do': 'Доступные команды:',
+    'wait_a_second': 'Секундочку...\n',
+    'error_retry': '😢 Произошла ошибка. Попробуйте еще раз.\nЕсли ничего не помогает, жмите /cancel.\n',
+    'fallback': 'Вы делаете что-то, что я не ожидаю в данный момент 😬. \nПопробуйте /cancel чтобы начать заново.\n',
+    'welcome_to_do': 'Приятно познакомиться! Выбирайте, что делать:\n',
+    'from_what_group': 'Давайте знакомиться! Из какой вы группы?\n',
+    'unavailable_for_group': 'Студентам этой группы еще недоступен бот или уже все дома. Попробуйте зайти позже.\n',
+    'select_among_group_students': 'Класс! Найдите себя среди студентов группы:\n',
+    'send_me_your_github': 'Отправьте мне ваш логин на github.com\n',
+    'no_github_account': 'Такого аккаунта нет на github: *{github_login}*\nВидимо, вы что\\-то не то ввели 😔\nПопробуйте еще раз\n',
+    'github_login_taken': 'Аккаунт *{github_login}* уже привязан к другому пользователю\\.\nПришлите другой логин\n',
+    'already_registered': 'Этот студент уже зарегистрирован.\nЕсли это ошибка, обратитесь к преподавателю.\n',
+    'cannot_chech_github': 'Что-то пока не могу проверить ваш аккаунт на github.\nПопробуйте чуть-чуть позже.\n',
+    'no_assignments': 'Пока нечего сдавать. Отдыхайте\n',
+    'select_homework_to_upload': 'Какую домашку вы хотите сдать?\n',
+    'select_test_to_upload': 'Какой тест хотите сдать?\n',
+    'select_task_to_upload': 'Какую задачу хотите сдать?\nВсе задачи по [ссылке]({gist_url})\n',
+    'send_me_the_file': 'Отправьте мне один файл с решенной задачей с расширением .py\n',
+    'wrong_file_format': 'Присланный вами файл не выглядит как скрипт на python. Проверьте, что шлете именно скрипт на python с расширением .py\n',
+    'file_uploaded': 'Ваша посылка принята в обработку. Это может занять некоторое время. Подождите ⏳\n',
+    'submission_created': 'Для задачи №{task_id} \\(*{assignment_name}*\\) создан новый [pull request]({pull_url})\\. Заходите\\.\n',
+    'submission_created_staff': '🎁\nПришло новое решение\\!\nЗадача *№{task_id}* \\({assignment_name}\\)\nСтудент: *{student_full_name}*\n[Ссылка]({pull_url})\n',
+    'submission_needwork': '🤔\nПо задаче *№{task_id}* \\({assignment_name}\\)\\ нужны правочки\\.\n[Ссылка]({pull_url})\n',
+    'submission_accepted': '🎉\nЗадачу *№{task_id}* \\(**{assignment_name}**\\) приняли\\.\nПосмотрите\\, может вам оставили какой\\-нибудь дельный комментарий\\.\n[Ссылка]({pull_url})\n',
+    'submission_transition_rejected': 'Задачу *№{task_id}* \\({assignment_name}\\) студента *{student_full_name}* не получилось перевести в *{new_status}*: сейчас она в статусе *{status}*\\.\nПопробуйте чуть позже\\.\n',
+    'comment_from_student': '[Комментарий]({pull_url}) от {student_full_name} в задаче №{task_id} \\({assignment_name}\\)\\.\n',
+    'push_from_student': '{student_full_name} внес изменения в код задачи №{task_id} \\({assignment_name}\\)\\.\n[Ссылка]({pull_url})\\.\n',
+    'invite_sent': 'Для вас был создан [новый репозиторий]({repo_url}) на GitHub\\. Чтобы получить туда доступ нужно **принять приглашение**, отправленное вам на почту\\. Почтовый адрес тот, который вы указывали в своем профиле на GitHub\\.\n',
+    'assignment_created': 'Новый ассайнмент создан\\.\n\nТип: *{assignment_type}*\\.\nНазвание: *{assignment_name}*\\.\nПорядковый номер: *{assignment_seq}*\\.\nГруппа: *{group_name}*\\.\nКоличество задач: *{tasks_count}*\\.\nGist: {gist_url}\\.\n\nТекст заданий из Gist был закеширован\\. \nЧтобы поменять текст перезагрузите gist через редактирование ассайнмента\\.\n\nВаш ассайнмент создан\\, но студенты его не видят\\. **Включить ассайнмент**\\?\n',
+    'assignment_info': 'Название: *{assignment_name}*\\.\nТип: *{assignment_type}*\\.\nПорядковый номер: *{assignment_seq}*\\.\nГруппа: *{assignment_group_name}*\\.\nКоличество задач: *{assignment_tasks_count}*\\.\nGist: {assignment_gist_url}\\.\n\n**Задачи по статусам:**\n \\- review: {by_status.review}\n \\- needwork: {by_status.needwork}\n \\- accepted: {by_status.accepted}\n',
+    'me_response': 'Имя в telegram: *{tg_full_name}*\nЛогин telegram: *{tg_username}*\nTelegram ID: `{tg_id}`\n',
+    'me_response_known': 'Имя в telegram: *{tg_full_name}*\nЛогин telegram: *{tg_username}*\nTelegram ID: `{tg_id}`\n\nГруппы: *{groups}*\nGitHub login: `{github_login}`\nИмя в ведомости: *{full_name}*\n',
+}
+
+
+ROLES_CONFIG = {
+    'commands': {
+        'upload_homework': {'name': 'Загрузить домашку'},
+        'upload_test': {'name': 'Сдать тест', 'availability': 'test'},
+        'review': {'name': 'Задачи на review'},
+        'create_assignment': {'name': 'Создать ассайнмент'},
+        'view_assignments': {'name': 'Ассайнменты'},
+    },
+    'roles': {
+        'student': ['upload_homework', 'upload_test'],
+        'assistant': ['view_assignments'],
+        'teacher': ['create_assignment', 'view_assignments'],
+        'admin': [
+            'upload_homework',
+            'upload_test',
+            'create_assignment',
+            'view_assignments',
+        ],
+    },
+}
+
+AVAILABILITY_ASSIGNMENT_TYPES = {
+    'test': models.AssignmentType.Test,
+}
+
+AVAILABILITY_TIMEOUT = 60
+
+
+def _availability_key(availability_alias: str, group_id: int) -> str:
+    return f'availability:{availability_alias}:{group_id}'
+
+
+def invalidate_availability(group_id: int) -> None:
+    cache.delete_many(
+        [
+            _availability_key(availability_alias, group_id)
+            for availability_alias in AVAILABILITY_ASSIGNMENT_TYPES
+        ]
+    )
+
 
 def commands_availability(
-    command: str, availability_alias: str, user: models.BotUser
+    command: str, availability_alias: str, group_ids: tp.Sequence[int]
 ) -> bool:
-    def _test_availability():
-        return (
-            len(
-                models.Assignment.get_available_for_user(
-                    user, models.AssignmentType.Test
-                )
-            )
-            > 0
-        )
+    assignment_type = AVAILABILITY_ASSIGNMENT_TYPES.get(availability_alias)
 
-    if availability_alias == 'test':
-        return _test_availability()
-
-    return True
-
-
-def get_user_commands(user: models.BotUser):
-    roles_config = {
-        'commands': {
-            'upload_homework': {'name': 'Загрузить домашку'},
-            'upload_test': {'name': 'Сдать тест', 'availability': 'test'},
-            'review': {'name': 'Задачи на review'},
-            'create_assignment': {'name': 'Создать ассайнмент'},
-            'view_assignments': {'name': 'Ассайнменты'},
-        },
-        'roles': {
-            'student': ['upload_homework', 'upload_test'],
-            'assistant': ['view_assignments'],
-            'teacher': ['create_assignment', 'view_assignments'],
-            'admin': [
-                'upload_homework',
-                'upload_test',
-                'create_assignment',
-                'view_assignments',
-            ],
-        },
+    if assignment_type is None:
+        return True
+
+    if not group_ids:
+        return False
+
+    keys = {
+        group_id: _availability_key(availability_alias, group_id)
+        for group_id in group_ids
     }
-    role_commands = roles_config['roles'].get(user.role)
+    cached = cache.get_many(keys.values())
+
+    if any(cached.values()):
+        return True
+
+    missing = [
+        group_id for group_id, key in keys.items() if key not in cached
+    ]
+    if not missing:
+        return False
+
+    available = set(
+        models.Assignment.get_available_for_groups(missing, assignment_type)
+        .values_list('group_id', flat=True)
+        .distinct()
+    )
+    cache.set_many(
+        {keys[group_id]: group_id in available for group_id in missing},
+        AVAILABILITY_TIMEOUT,
+    )
+
+    return bool(available)
+
+
+def get_user_commands(role: str, group_ids: tp.Sequence[int]):
+    role_commands = ROLES_CONFIG['roles'].get(role)
 
     if not role_commands:
         return []
 
     for command in role_commands:
-        if command not in roles_config['commands']:
+        if command not in ROLES_CONFIG['commands']:
             continue
 
-        command_config = roles_config['commands'][command]
+        command_config = ROLES_CONFIG['commands'][command]
 
         if 'availability' in command_config and not commands_availability(
-            command, command_config['availability'], user
+            command, command_config['availability'], group_ids
         ):
             continue
 
@@ -163,51 +243,50 @@ def upload_file_to_s3(file: File) -> str:
     return objectkey
 
 
+# Same characters as telegram.utils.helpers.escape_markdown(version=2)
+_MARKDOWN_ESCAPE_TABLE = str.maketrans(
+    {char: '\\' + char for char in r'_*[]()~`>#+-=|{}.!'}
+)
+
+
 def escape_markdown(text: str) -> str:
-    return telegram_helpers.escape_markdown(text, version=2)
+    return text.translate(_MARKDOWN_ESCAPE_TABLE)
+
+
+def _load_messages(locale: tp.Optional[str]) -> tp.Dict[str, str]:
+    messages = dict(DEFAULT_MESSAGES)
+
+    if locale:
+        import yaml  # only needed for localized messages
+
+        path = os.path.join(MESSAGES_DIR, f'{locale}.yaml')
+        with open(path) as file:
+            messages.update(yaml.safe_load(file))
+        logger.info('Messages for locale %s loaded from %s', locale, path)
+
+    return messages
+
+
+MESSAGES = _load_messages(settings.BOT_LOCALE)
+
+
+@functools.lru_cache(maxsize=None)
+def _get_static_message(alias: str) -> str:
+    return MESSAGES[alias].format()
 
 
 def get_message(alias: str, escape_kwargs: bool = True, **kwargs):
-    logger.info('Getting message for alias: %s', alias)
-    messages = {
-        'start_to_do': 'Доступные команды:',
-        'wait_a_second': 'Секундочку...\n',
-        'error_retry': '😢 Произошла ошибка. Попробуйте еще раз.\nЕсли ничего не помогает, жмите /cancel.\n',
-        'fallback': 'Вы делаете что-то, что я не ожидаю в данный момент 😬. \nПопробуйте /cancel чтобы начать заново.\n',
-        'welcome_to_do': 'Приятно познакомиться! Выбирайте, что делать:\n',
-        'from_what_group': 'Давайте знакомиться! Из какой вы группы?\n',
-        'unavailable_for_group': 'Студентам этой группы еще недоступен бот или уже все дома. Попробуйте зайти позже.\n',
-        'select_among_group_students': 'Класс! Найдите себя среди студентов группы:\n',
-        'send_me_your_github': 'Отправьте мне ваш логин на github.com\n',
-        'no_github_account': 'Такого аккаунта нет на github: *{github_login}*\nВидимо, вы что\\-то не то ввели 😔\nПопробуйте еще раз\n',
-        'cannot_chech_github': 'Что-то пока не могу проверить ваш аккаунт на github.\nПопробуйте чуть-чуть позже.\n',
-        'no_assignments': 'Пока нечего сдавать. Отдыхайте\n',
-        'select_homework_to_upload': 'Какую домашку вы хотите сдать?\n',
-        'select_test_to_upload': 'Какой тест хотите сдать?\n',
-        'select_task_to_upload': 'Какую задачу хотите сдать?\nВсе задачи по [ссылке]({gist_url})\n',
-        'send_me_the_file': 'Отправьте мне один файл с решенной задачей с расширением .py\n',
-        'wrong_file_format': 'Присланный вами файл не выглядит как скрипт на python. Проверьте, что шлете именно скрипт на python с расширением .py\n',
-        'file_uploaded': 'Ваша посылка принята в обработку. Это может занять некоторое время. Подождите ⏳\n',
-        'submission_created': 'Для задачи №{task_id} \\(*{assignment_name}*\\) создан новый [pull request]({pull_url})\\. Заходите\\.\n',
-        'submission_created_staff': '🎁\nПришло новое решение\\!\nЗадача *№{task_id}* \\({assignment_name}\\)\nСтудент: *{student_full_name}*\n[Ссылка]({pull_url})\n',
-        'submission_needwork': '🤔\nПо задаче *№{task_id}* \\({assignment_name}\\)\\ нужны правочки\\.\n[Ссылка]({pull_url})\n',
-        'submission_accepted': '🎉\nЗадачу *№{task_id}* \\(**{assignment_name}**\\) приняли\\.\nПосмотрите\\, может вам оставили какой\\-нибудь дельный комментарий\\.\n[Ссылка]({pull_url})\n',
-        'comment_from_student': '[Комментарий]({pull_url}) от {student_full_name} в задаче №{task_id} \\({assignment_name}\\)\\.\n',
-        'push_from_student': '{student_full_name} внес изменения в код задачи №{task_id} \\({assignment_name}\\)\\.\n[Ссылка]({pull_url})\\.\n',
-        'invite_sent': 'Для вас был создан [новый репозиторий]({repo_url}) на GitHub\\. Чтобы получить туда доступ нужно **принять приглашение**, отправленное вам на почту\\. Почтовый адрес тот, который вы указывали в своем профиле на GitHub\\.\n',
-        'assignment_created': 'Новый ассайнмент создан\\.\n\nТип: *{assignment_type}*\\.\nНазвание: *{assignment_name}*\\.\nПорядковый номер: *{assignment_seq}*\\.\nГруппа: *{group_name}*\\.\nКоличество задач: *{tasks_count}*\\.\nGist: {gist_url}\\.\n\nТекст заданий из Gist был закеширован\\. \nЧтобы поменять текст перезагрузите gist через редактирование ассайнмента\\.\n\nВаш ассайнмент создан\\, но студенты его не видят\\. **Включить ассайнмент**\\?\n',
-        'assignment_info': 'Название: *{assignment_name}*\\.\nТип: *{assignment_type}*\\.\nПорядковый номер: *{assignment_seq}*\\.\nГруппа: *{assignment_group_name}*\\.\nКоличество задач: *{assignment_tasks_count}*\\.\nGist: {assignment_gist_url}\\.\n\n**Задачи по статусам:**\n \\- review: {by_status.review}\n \\- needwork: {by_status.needwork}\n \\- accepted: {by_status.accepted}\n',
-        'me_response': 'Имя в telegram: *{tg_full_name}*\nЛогин telegram: *{tg_username}*\nTelegram ID: `{tg_id}`\n',
-        'me_response_known': 'Имя в telegram: *{tg_full_name}*\nЛогин telegram: *{tg_username}*\nTelegram ID: `{tg_id}`\n\nГруппы: *{groups}*\nGitHub login: `{github_login}`\nИмя в ведомости: *{full_name}*\n',
-    }
+    logger.debug('Getting message for alias: %s', alias)
+
+    if not kwargs:
+        return _get_static_message(alias)
 
     if escape_kwargs:
-        for key in kwargs:
-            if isinstance(kwargs[key], str):
-                kwargs[key] = escape_markdown(kwargs[key])
+        for key, value in kwargs.items():
+            if isinstance(value, str):
+                kwargs[key] = value.translate(_MARKDOWN_ESCAPE_TABLE)
 
-    message = messages[alias].format(**kwargs)
-    return message
+    return MESSAGES[alias].format(**kwargs)
 
 
 def extract_data(
@@ -250,8 +329,7 @@ def build_task_list(
             ret += f' [{submission_status}]'
         return ret
 
-    for i in range(assignment.tasks_count):
-        task_id = i + 1
+    for task_id in assignment.task_ids:
         task_submission = task_id_to_submission_map.get(task_id)
         status = task_submission.status if task_submission else None
 
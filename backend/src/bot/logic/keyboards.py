@@ -0,0 +1,104 @@
+import logging
+import time
+import typing as tp
+
+from django.core.cache import cache
+from django.core.cache import caches
+from telegram import InlineKeyboardMarkup
+
+from bot.logic import helpers
+from bot.logic import user_context
+
+
+logger = logging.getLogger(__name__)
+
+KEYBOARD_TIMEOUT = 10 * 60
+
+GROUPS = 'groups'
+
+ASSIGNMENTS = 'assignments'
+
+# Data changes in one process, e.g. an assignment imported by a celery
+# task, have to rebuild keyboards cached by the others
+shared_cache = caches['shared']
+
+# Versions are kept in process memory, so a bump by another process is
+# seen with this delay and hot menus do not query the shared cache
+LOCAL_VERSION_TIMEOUT = 10
+
+
+def _version_key(data: str) -> str:
+    return f'keyboards:version:{data}'
+
+
+def _new_version() -> int:
+    # Time based, so a lost version never matches keyboards built before
+    return time.time_ns()
+
+
+def bump_version(data: str) -> None:
+    key = _version_key(data)
+    version = _new_version()
+    shared_cache.set(key, version, None)
+    cache.set(key, version, LOCAL_VERSION_TIMEOUT)
+
+
+def _get_versions(data: tp.Sequence[str]) -> tp.List[int]:
+    keys = [_version_key(item) for item in data]
+    versions = cache.get_many(keys)
+
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        shared = shared_cache.get_many(missing)
+        for key in missing:
+            if key not in shared:
+                shared_cache.add(key, _new_version(), None)
+                shared[key] = shared_cache.get(key)
+
+        cache.set_many(shared, LOCAL_VERSION_TIMEOUT)
+        versions.update(shared)
+
+    return [versions[key] for key in keys]
+
+
+def get_keyboard(
+    kind: str,
+    build: tp.Callable[[], tp.Optional[InlineKeyboardMarkup]],
+    role: tp.Optional[str] = None,
+    groups: tp.Iterable[int] = (),
+    data: tp.Sequence[str] = (),
+) -> tp.Optional[InlineKeyboardMarkup]:
+    """Cached keyboard of a menu, rebuilt when any of its ``data`` changes
+
+    ``build`` returns None for an empty menu, which is cached as well.
+    """
+    versions = '.'.join(str(version) for version in _get_versions(data))
+    key = (
+        f'keyboards:{kind}:{role}:'
+        f'{",".join(str(group) for group in groups)}:{versions}'
+    )
+
+    cached = cache.get(key)
+    if cached is not None:
+        return cached[0]
+
+    logger.debug('Building keyboard %s', key)
+    markup = build()
+    cache.set(key, (markup,), KEYBOARD_TIMEOUT)
+
+    return markup
+
+
+def get_commands_keyboard(
+    user_ctx: user_context.UserContext,
+) -> InlineKeyboardMarkup:
+    return get_keyboard(
+        'commands',
+        lambda: helpers.inline_keyboard(
+            helpers.get_user_commands(user_ctx.role, user_ctx.group_ids),
+            'known',
+        ),
+        role=user_ctx.role,
+        groups=user_ctx.group_ids,
+        data=[ASSIGNMENTS],
+    )
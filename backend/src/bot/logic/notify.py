@@ -1,8 +1,13 @@
 import logging
+import typing as tp
 
 import telegram
 from django.conf import settings
+from opentelemetry import trace
+from telegram.utils import request as tg_request
 
+from app import metrics
+from app import tracing
 from bot import models
 from bot.logic import helpers
 
@@ -10,8 +15,31 @@ from bot.logic import helpers
 logger = logging.getLogger(__name__)
 
 
+class _InstrumentedRequest(tg_request.Request):
+    def post(self, url: str, data: dict, timeout: float = None):
+        method = url.rpartition('/')[2]
+        with tracing.tracer.start_as_current_span(
+            f'telegram {method}', kind=trace.SpanKind.CLIENT
+        ), metrics.api_call('telegram', method):
+            return super().post(url, data, timeout)
+
+    def retrieve(self, url: str, timeout: float = None) -> bytes:
+        # Files uploaded by users are downloaded from their URLs
+        with tracing.tracer.start_as_current_span(
+            'telegram download', kind=trace.SpanKind.CLIENT
+        ), metrics.api_call('telegram', 'download'):
+            return super().retrieve(url, timeout)
+
+
+def create_bot(con_pool_size: int = 1) -> telegram.Bot:
+    return telegram.Bot(
+        settings.TELEGRAM_TOKEN,
+        request=_InstrumentedRequest(con_pool_size=con_pool_size),
+    )
+
+
 def notify_new_submission(submission: models.Submission) -> None:
-    bot = telegram.Bot(settings.TELEGRAM_TOKEN)
+    bot = create_bot()
     author = submission.author
 
     msg_kwargs = {
@@ -48,7 +76,7 @@ def notify_new_submission(submission: models.Submission) -> None:
 
 
 def notify_needwork(submission: models.Submission) -> None:
-    bot = telegram.Bot(settings.TELEGRAM_TOKEN)
+    bot = create_bot()
     msg = helpers.get_message(
         'submission_needwork',
         task_id=submission.task_id,
@@ -63,7 +91,7 @@ def notify_needwork(submission: models.Submission) -> None:
 
 
 def notify_accepted(submission: models.Submission) -> None:
-    bot = telegram.Bot(settings.TELEGRAM_TOKEN)
+    bot = create_bot()
     msg = helpers.get_message(
         'submission_accepted',
         task_id=submission.task_id,
@@ -77,12 +105,36 @@ def notify_accepted(submission: models.Submission) -> None:
     )
 
 
+def notify_transition_rejected(
+    reviewer: models.BotUser,
+    submission: models.Submission,
+    status: models.SubmissionStatus,
+) -> None:
+    if reviewer.telegram_chat_id is None:
+        return
+
+    bot = create_bot()
+    msg = helpers.get_message(
+        'submission_transition_rejected',
+        task_id=submission.task_id,
+        assignment_name=submission.real_assignment.name,
+        student_full_name=submission.author.full_name,
+        status=submission.status,
+        new_status=status.value,
+    )
+    bot.send_message(
+        reviewer.telegram_chat_id,
+        msg,
+        parse_mode=telegram.ParseMode.MARKDOWN_V2,
+    )
+
+
 def notify_student_comment(
     submission: models.Submission,
     commenter: models.BotUser,
     text_fragment: str,
 ) -> None:
-    bot = telegram.Bot(settings.TELEGRAM_TOKEN)
+    bot = create_bot()
 
     msg_kwargs = {
         'pull_url': submission.pull_url,
@@ -108,7 +160,7 @@ def notify_student_comment(
 def notify_student_push(
     submission: models.Submission, student: models.BotUser
 ) -> None:
-    bot = telegram.Bot(settings.TELEGRAM_TOKEN)
+    bot = create_bot()
 
     msg_kwargs = {
         'pull_url': submission.pull_url,
@@ -132,7 +184,7 @@ def notify_student_push(
 
 
 def notify_invite_sent(user: models.BotUser, repo_url: str) -> None:
-    bot = telegram.Bot(settings.TELEGRAM_TOKEN)
+    bot = create_bot()
     msg = helpers.get_message('invite_sent', repo_url=repo_url)
     bot.send_message(
         user.telegram_chat_id, msg, parse_mode=telegram.ParseMode.MARKDOWN_V2
@@ -140,7 +192,81 @@ def notify_invite_sent(user: models.BotUser, repo_url: str) -> None:
 
 
 def notify_bad_encoding(submission: models.Submission) -> None:
-    bot = telegram.Bot(settings.TELEGRAM_TOKEN)
+    bot = create_bot()
     bot.send_message(
         settings.ADMIN_CHAT_ID, f'Bad encoding. Submission id: {submission.id}'
     )
+
+
+def _format_gist_errors(errors: tp.Dict[str, str]) -> str:
+    return ''.join(
+        helpers.escape_markdown(f'\n - {filename}: {error}')
+        for filename, error in errors.items()
+    )
+
+
+def notify_assignment_imported(
+    chat_id: int,
+    message_id: int,
+    assignment: models.Assignment,
+    errors: tp.Dict[str, str],
+) -> None:
+    bot = create_bot()
+    msg = helpers.get_message(
+        'assignment_created',
+        assignment_type=assignment.type,
+        assignment_name=assignment.name,
+        assignment_seq=assignment.seq,
+        group_name=assignment.group.name,
+        tasks_count=assignment.tasks_count,
+        gist_url=assignment.gist_url,
+    )
+    if errors:
+        msg += '\nПропущенные файлы:' + _format_gist_errors(errors)
+
+    bot.edit_message_text(
+        msg,
+        chat_id,
+        message_id,
+        parse_mode=telegram.ParseMode.MARKDOWN_V2,
+        reply_markup=helpers.inline_keyboard(
+            [
+                {'name': 'Да', 'alias': f'{assignment.id}:true'},
+                {'name': 'Нет', 'alias': f'{assignment.id}:false'},
+            ],
+            'wait_enable_assignment',
+            column=False,
+        ),
+    )
+
+
+def notify_assignment_import_failed(
+    chat_id: int,
+    message_id: int,
+    text: str,
+    errors: tp.Optional[tp.Dict[str, str]] = None,
+) -> None:
+    bot = create_bot()
+    msg = helpers.escape_markdown(text)
+    if errors:
+        msg += _format_gist_errors(errors)
+    bot.edit_message_text(
+        msg, chat_id, message_id, parse_mode=telegram.ParseMode.MARKDOWN_V2
+    )
+
+
+def edit_message(
+    chat_id: int,
+    message_id: int,
+    msg: str,
+    markdown: bool = False,
+    reply_markup: tp.Optional[telegram.InlineKeyboardMarkup] = None,
+) -> None:
+    bot = create_bot()
+    bot.edit_message_text(
+        msg,
+        chat_id,
+        message_id,
+        parse_mode=telegram.ParseMode.MARKDOWN_V2 if markdown else None,
+        reply_markup=reply_markup,
+    )
@@ -5,6 +5,8 @@ import github
 import chardet
 import boto3
 
+from app import metrics
+from app import tracing
 from bot import models
 from bot.logic import gh
 from bot.logic import notify
@@ -13,6 +15,8 @@ from bot.logic import notify
 logger = logging.getLogger(__name__)
 
 
+@tracing.traced
+@metrics.stage('processing')
 def start_processing(submission_id: int, need_notify: bool = True) -> None:
     github_client = gh.get_client()
     github_settings = {
@@ -20,93 +24,108 @@ def start_processing(submission_id: int, need_notify: bool = True) -> None:
         'assignments_repo_placeholder': 'assignments_{}',
     }
 
-    submission = models.Submission.objects.get(id=submission_id)
-
-    logger.info('Start processing %s', submission)
+    logger.info('Set status processing')
 
-    if submission.status not in [
-        models.SubmissionStatus.Pending.value,
-        models.SubmissionStatus.Processing.value,
-    ]:
+    if not models.Submission.transition(
+        submission_id, models.SubmissionStatus.Processing
+    ):
         logger.info('Incorrect status for handling. Exit')
         return
 
-    logger.info('Set status processing')
-    submission.status = models.SubmissionStatus.Processing.value
-    submission.save()
-
-    user = submission.author
-
-    org = github_client.get_organization(github_settings['org'])
+    submission = models.Submission.objects.select_related(
+        'author', 'real_assignment'
+    ).get(id=submission_id)
 
-    logger.info('Loaded github organization: %s', org)
+    logger.info('Start processing %s', submission)
 
-    gh_repo, db_repo = gh.get_or_create_assignments_repository(org, user)
+    user = submission.author
 
     submission_content = extract_submission_content(submission)
 
-    ref, branch = create_new_branch(gh_repo, submission)
-
-    logger.info('Creating file with solution in the new branch...')
+    with metrics.stage('github'):
+        with metrics.api_call('github', 'get_organization'):
+            org = github_client.get_organization(github_settings['org'])
 
-    solution_file = (
-        f'{submission.real_assignment.type}/'
-        f'{submission.real_assignment.seq}/'
-        f'{submission.task_id}/'
-        f'solution.py'
-    )
+        logger.info('Loaded github organization: %s', org)
 
-    try:
-        gh_repo.create_file(
-            solution_file,
-            'add solution file',
-            submission_content,
-            branch=branch,
-        )
-    except github.GithubException as exc:
-        logger.warning(
-            'Exception while creating file: %s. May be file exists?', exc
-        )
-        try:
-            gh_repo.get_contents(solution_file, branch)
-        except github.GithubException:
-            logger.exception(
-                'Cannot create file %s and it is not exist. Raise...',
-                solution_file,
+        with metrics.api_call('github', 'get_or_create_repository'):
+            gh_repo, db_repo = gh.get_or_create_assignments_repository(
+                org, user
             )
-            raise
 
-    logger.info('Creating pull request...')
+        with metrics.api_call('github', 'create_branch'):
+            ref, branch = create_new_branch(gh_repo, submission)
 
-    new_pull_settings = {
-        'title': '[{assignment_type}] / {assignment_name} / Задача №{task_id}\n',
-        'base_branch': 'main',
-        'body': '{task_content}\n\n---\n\n**Студент:** {author_full_name}\n\n**Группа:** {author_group_name}\n',
-    }
+        logger.info('Creating file with solution in the new branch...')
 
-    format_kwargs = prepare_formatting_kwargs(submission, user)
+        solution_file = (
+            f'{submission.real_assignment.type}/'
+            f'{submission.real_assignment.seq}/'
+            f'{submission.task_id}/'
+            f'solution.py'
+        )
 
-    pull = gh_repo.create_pull(
-        title=new_pull_settings['title'].format(**format_kwargs),
-        base=new_pull_settings['base_branch'],
-        body=new_pull_settings['body'].format(**format_kwargs),
-        head=branch,
-    )
+        try:
+            with metrics.api_call('github', 'create_file'):
+                gh_repo.create_file(
+                    solution_file,
+                    'add solution file',
+                    submission_content,
+                    branch=branch,
+                )
+        except github.GithubException as exc:
+            logger.warning(
+                'Exception while creating file: %s. May be file exists?', exc
+            )
+            try:
+                with metrics.api_call('github', 'get_contents'):
+                    gh_repo.get_contents(solution_file, branch)
+            except github.GithubException:
+                logger.exception(
+                    'Cannot create file %s and it is not exist. Raise...',
+                    solution_file,
+                )
+                raise
+
+        logger.info('Creating pull request...')
+
+        new_pull_settings = {
+            'title': '[{assignment_type}] / {assignment_name} / Задача №{task_id}\n',
+            'base_branch': 'main',
+            'body': '{task_content}\n\n---\n\n**Студент:** {author_full_name}\n\n**Группа:** {author_group_name}\n',
+        }
+
+        format_kwargs = prepare_formatting_kwargs(submission, user)
+
+        with metrics.api_call('github', 'create_pull'):
+            pull = gh_repo.create_pull(
+                title=new_pull_settings['title'].format(**format_kwargs),
+                base=new_pull_settings['base_branch'],
+                body=new_pull_settings['body'].format(**format_kwargs),
+                head=branch,
+            )
 
     logger.info('New pull request: %s', pull)
     logger.info('Saving state in submission...')
 
-    submission.status = models.SubmissionStatus.Review.value
-    submission.repository = db_repo
-    submission.pull_url = pull.html_url
-    submission.git_ref = ref
+    transitioned = models.Submission.transition(
+        submission.id,
+        models.SubmissionStatus.Review,
+        'review',
+        repository=db_repo,
+        pull_url=pull.html_url,
+        git_ref=ref,
+    )
 
-    submission.save()
+    if not transitioned:
+        logger.warning('Submission was changed while processing. Exit')
+        return
 
-    submission.create_event('review')
+    submission.pull_url = pull.html_url
 
     if need_notify:
-        notify.notify_new_submission(submission)
+        with metrics.stage('notify'):
+            notify.notify_new_submission(submission)
 
 
 def extract_submission_content(submission: models.Submission) -> str:
@@ -120,12 +139,14 @@ def extract_submission_content(submission: models.Submission) -> str:
         endpoint_url=settings.YC_S3_URL,
     )
 
-    object_ = s3.get_object(
-        Bucket=settings.YC_S3_BUCKET, Key=submission.objectkey
-    )
-    body = object_['Body'].read()
+    with metrics.stage('s3_download'):
+        object_ = s3.get_object(
+            Bucket=settings.YC_S3_BUCKET, Key=submission.objectkey
+        )
+        body = object_['Body'].read()
 
-    detection_result = chardet.detect(body)
+    with metrics.stage('decode'):
+        detection_result = chardet.detect(body)
 
     logger.info(
         f'Body of {submission} encoding detection result: '
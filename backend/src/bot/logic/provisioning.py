@@ -0,0 +1,113 @@
+import dataclasses
+import logging
+import threading
+import time
+import typing as tp
+from concurrent import futures
+
+from django.db import connection
+from django.db.models import QuerySet
+import github
+
+from bot import models
+from bot.logic import gh
+
+
+logger = logging.getLogger(__name__)
+
+ASSIGNMENTS_ORG = 'pykili'
+
+
+class RateLimiter:
+    """Spaces calls of all threads at least ``1 / rate`` seconds apart"""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate
+        self.lock = threading.Lock()
+        self.next_at = time.monotonic()
+
+    def wait(self) -> None:
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_at - now
+            self.next_at = max(now, self.next_at) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+@dataclasses.dataclass
+class ProvisionResult:
+    created: int = 0
+    failed: tp.List[int] = dataclasses.field(default_factory=list)
+
+
+def get_users_without_repository(
+    user_ids: tp.Optional[tp.Iterable[int]] = None,
+) -> QuerySet:
+    users = models.BotUser.objects.filter(
+        role=models.BotUserRole.Student.value,
+        github_login__isnull=False,
+        repository__isnull=True,
+    )
+    if user_ids:
+        users = users.filter(id__in=user_ids)
+    return users.order_by('id')
+
+
+def provision_repositories(
+    user_ids: tp.Optional[tp.Iterable[int]] = None,
+    workers: int = 4,
+    rate: float = 1.0,
+) -> ProvisionResult:
+    """Create and bootstrap assignment repositories ahead of submissions
+
+    Users with a repository are skipped, and a half-done repository is
+    finished by _bootstrap_repo, which checks the .bootstrap marker.
+    """
+    users = list(get_users_without_repository(user_ids))
+    limiter = RateLimiter(rate)
+
+    logger.info('Provisioning repositories for %s users', len(users))
+
+    def _provision(org: github.Organization, user: models.BotUser) -> bool:
+        limiter.wait()
+
+        try:
+            gh.get_or_create_assignments_repository(org, user)
+            return True
+        except Exception:
+            logger.exception('Cannot provision repository for %s', user)
+            return False
+
+    def _provision_bucket(bucket: tp.List[models.BotUser]) -> ProvisionResult:
+        bucket_result = ProvisionResult()
+        try:
+            if not bucket:
+                return bucket_result
+            org = gh.get_client().get_organization(ASSIGNMENTS_ORG)
+            for user in bucket:
+                if _provision(org, user):
+                    bucket_result.created += 1
+                else:
+                    bucket_result.failed.append(user.id)
+        finally:
+            # Every worker thread opens its own connection
+            connection.close()
+        return bucket_result
+
+    result = ProvisionResult()
+
+    with futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        for bucket_result in executor.map(
+            _provision_bucket, [users[i::workers] for i in range(workers)]
+        ):
+            result.created += bucket_result.created
+            result.failed.extend(bucket_result.failed)
+
+    logger.info(
+        'Provisioned %s repositories, failed: %s',
+        result.created,
+        result.failed,
+    )
+
+    return result
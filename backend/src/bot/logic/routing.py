@@ -0,0 +1,95 @@
+import dataclasses
+import logging
+import typing as tp
+
+from django.core.cache import cache
+
+from bot import models
+
+
+logger = logging.getLogger(__name__)
+
+SUBMISSION_ROUTE_TIMEOUT = 60 * 60
+
+USER_ROUTE_TIMEOUT = 5 * 60
+
+
+@dataclasses.dataclass(frozen=True)
+class UserRoute:
+    id: int
+    role: str
+
+    @property
+    def is_staff(self) -> bool:
+        return self.role in models.STAFF_ROLES
+
+
+def _pull_url_key(pull_url: str) -> str:
+    return f'routing:pull_url:{pull_url}'
+
+
+def _github_login_key(github_login: str) -> str:
+    return f'routing:github_login:{github_login.lower()}'
+
+
+def get_submission_id_by_pull_url(pull_url: str) -> tp.Optional[int]:
+    key = _pull_url_key(pull_url)
+    submission_id = cache.get(key)
+
+    if submission_id is None:
+        submission_id = (
+            models.Submission.objects.filter(pull_url=pull_url)
+            .values_list('id', flat=True)
+            .first()
+        )
+        if submission_id is not None:
+            cache.set(key, submission_id, SUBMISSION_ROUTE_TIMEOUT)
+
+    return submission_id
+
+
+def get_submission_id_by_git_ref(
+    repository_name: str, git_ref: str
+) -> tp.Optional[int]:
+    # Not cached: a branch is reused by the next submission of the task,
+    # which is written by the celery worker. One query on
+    # submission_repo_ref_idx is what a shared cache lookup would cost
+    return (
+        models.Submission.objects.filter(
+            repository__name=repository_name, git_ref=git_ref
+        )
+        .order_by('-id')
+        .values_list('id', flat=True)
+        .first()
+    )
+
+
+def get_user_by_github_login(github_login: str) -> tp.Optional[UserRoute]:
+    key = _github_login_key(github_login)
+    route = cache.get(key)
+
+    if route is None:
+        row = (
+            models.BotUser.filter_by_github_login(github_login)
+            .values_list('id', 'role')
+            .first()
+        )
+        if row is not None:
+            route = UserRoute(*row)
+            cache.set(key, route, USER_ROUTE_TIMEOUT)
+
+    return route
+
+
+def invalidate_routes(pull_url: tp.Optional[str]) -> None:
+    if pull_url:
+        cache.delete(_pull_url_key(pull_url))
+
+
+def invalidate_submission(submission: models.Submission) -> None:
+    invalidate_routes(submission.pull_url)
+
+
+def invalidate_user(user: models.BotUser) -> None:
+    if user.github_login:
+        cache.delete(_github_login_key(user.github_login))
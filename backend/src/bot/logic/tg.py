@@ -2,6 +2,10 @@ from django.conf import settings
 from telegram import ext as telegram_ext
 
 from bot.logic import handlers
+from bot.logic import notify
+
+# Dispatcher workers and the updater share the connection pool
+BOT_CON_POOL_SIZE = 8
 
 
 def create_updater():
@@ -9,7 +13,7 @@ def create_updater():
         filename=settings.BOT_PERSISTENCE_PICKLE_FILE
     )
     updater = telegram_ext.Updater(
-        settings.TELEGRAM_TOKEN,
+        bot=notify.create_bot(BOT_CON_POOL_SIZE),
         use_context=True,
         persistence=persistence,
     )
@@ -0,0 +1,81 @@
+import dataclasses
+import logging
+import typing as tp
+
+import telegram as tg
+from django.core.cache import cache
+
+from bot import models
+
+
+logger = logging.getLogger(__name__)
+
+USER_CONTEXT_TIMEOUT = 60
+
+_UPDATE_ATTR = '_bot_user_context'
+
+
+@dataclasses.dataclass(frozen=True)
+class UserContext:
+    user: models.BotUser
+    group_ids: tp.Tuple[int, ...]
+
+    @property
+    def role(self) -> str:
+        return self.user.role
+
+    @property
+    def is_staff(self) -> bool:
+        return self.user.is_staff
+
+
+def _chat_key(telegram_chat_id: int) -> str:
+    return f'user_context:{telegram_chat_id}'
+
+
+def get_user_context(telegram_chat_id: int) -> tp.Optional[UserContext]:
+    key = _chat_key(telegram_chat_id)
+    user_context = cache.get(key)
+
+    if user_context is None:
+        user = models.BotUser.get_or_none(telegram_chat_id)
+        # Misses are not cached: the user may register any moment
+        if user is None:
+            return None
+        user_context = UserContext(
+            user=user,
+            group_ids=tuple(
+                user.groups.order_by('id').values_list('id', flat=True)
+            ),
+        )
+        cache.set(key, user_context, USER_CONTEXT_TIMEOUT)
+
+    return user_context
+
+
+def for_update(update: tg.Update) -> tp.Optional[UserContext]:
+    """User context of the update author, resolved once per update"""
+    user_context = getattr(update, _UPDATE_ATTR, None)
+
+    # Unknown users are looked up again, registration may happen in between
+    if user_context is None:
+        user_context = get_user_context(update.effective_chat.id)
+        setattr(update, _UPDATE_ATTR, user_context)
+
+    return user_context
+
+
+def invalidate(telegram_chat_id: tp.Optional[int]) -> None:
+    if telegram_chat_id is not None:
+        cache.delete(_chat_key(telegram_chat_id))
+
+
+def invalidate_users(user_ids: tp.Iterable[int]) -> None:
+    cache.delete_many(
+        [
+            _chat_key(telegram_chat_id)
+            for telegram_chat_id in models.BotUser.objects.filter(
+                id__in=user_ids, telegram_chat_id__isnull=False
+            ).values_list('telegram_chat_id', flat=True)
+        ]
+    )
@@ -65,14 +65,26 @@ class Command(BaseCommand):
 
         self.stdout.write(self.style.SUCCESS('Submission processed'))
 
-        if options['accepted']:
-            self.stdout.write(self.style.WARNING('Setting accepted status'))
-            submission.status = models.SubmissionStatus.Accepted.value
-            submission.save()
+        payload = {'submission_gist_url': options['submission_gist_url']}
 
-        submission.create_event(
-            'migrated',
-            payload={'submission_gist_url': options['submission_gist_url']},
-        )
+        if not options['accepted']:
+            submission.create_event('migrated', payload=payload)
+        else:
+            self.stdout.write(self.style.WARNING('Setting accepted status'))
+            # Moves the assignment stats and invalidates the routes as well
+            transitioned = models.Submission.transition(
+                submission.id,
+                models.SubmissionStatus.Accepted,
+                'migrated',
+                payload=payload,
+            )
+            if not transitioned:
+                self.stdout.write(
+                    self.style.ERROR(
+                        f'{submission} can not be accepted '
+                        f'from status {submission.status}'
+                    )
+                )
+                return
 
         self.stdout.write(self.style.SUCCESS('DONE'))
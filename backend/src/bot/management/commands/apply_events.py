@@ -1,13 +1,20 @@
 from __future__ import annotations
 
+import collections
 import dataclasses
 import datetime
 import json
+import os
+import time
 import typing as tp
+from concurrent import futures
 
 from django.core.management.base import BaseCommand
-import dateparser
+from django.db import connection
+from django.db.models.functions import Lower
+from django.utils import timezone
 
+from app.utils import dates as dates_utils
 from bot import models
 from bot import tasks
 
@@ -24,8 +31,14 @@ class EventItem:
 
     @classmethod
     def from_dict(cls, data: dict) -> EventItem:
-        if isinstance(data['occured_at'], str):
-            data['occured_at'] = dateparser.parse(data['occured_at'])
+        occured_at = data['occured_at']
+        if isinstance(occured_at, str):
+            occured_at = dates_utils.parse_timestring(occured_at)
+        if timezone.is_naive(occured_at):
+            # The time Django would assume on save, a naive time never
+            # equals the aware ones of the applied events
+            occured_at = timezone.make_aware(occured_at)
+        data['occured_at'] = occured_at
         return cls(**data)
 
     def to_dict(self) -> dict:
@@ -37,35 +50,55 @@ class EventItem:
         return di
 
 
+@dataclasses.dataclass
+class EventLine:
+    line: str
+    event: tp.Optional[EventItem] = None
+    error: tp.Optional[str] = None
+
+
 class BaseEventHandler:
     error = ValueError
 
     event: EventItem
 
-    def __init__(self, event: EventItem, run: bool):
+    def __init__(
+        self,
+        event: EventItem,
+        run: bool,
+        users: tp.Dict[str, models.BotUser],
+        submissions: tp.Dict[str, models.Submission],
+        applied: tp.Set[tp.Tuple[int, str, datetime.datetime]],
+    ):
         self.event = event
         self.run = run
+        self.users = users
+        self.submissions = submissions
+        self.applied = applied
 
     def __call__(self):
         raise NotImplementedError
 
     def get_user_and_submission(self):
-        submission = models.Submission.objects.filter(
-            pull_url=self.event.pull_url
-        ).first()
+        submission = self.submissions.get(self.event.pull_url)
 
         if not submission:
             raise self.error(f'No submission for pull: {self.event.pull_url}')
 
-        user = models.BotUser.objects.filter(
-            github_login__iexact=self.event.author
-        ).first()
+        user = self.users.get(self.event.author.lower())
 
         if not user:
             raise self.error(f'Unknown user: {self.event.author}')
 
         return user, submission
 
+    def should_apply(self, submission: models.Submission, event: str) -> bool:
+        # A resumed run repeats the batch it crashed in, events which are
+        # already written are skipped
+        return self.run and (
+            (submission.id, event, self.event.occured_at) not in self.applied
+        )
+
 
 class SubmissionCommentHandler(BaseEventHandler):
     _commands = ('/accepted', '/needwork')
@@ -83,14 +116,14 @@ class SubmissionCommentHandler(BaseEventHandler):
         self, command: str, user: models.BotUser, submission: models.Submission
     ):
         if command == '/needwork':
-            if self.run:
+            if self.should_apply(submission, 'needwork'):
                 tasks.process_needwork(
                     submission.id,
                     event_dt=self.event.occured_at,
                     need_notify=False,
                 )
         elif command == '/accepted':
-            if self.run:
+            if self.should_apply(submission, 'accepted'):
                 tasks.process_accepted(
                     submission.id,
                     user.id,
@@ -103,7 +136,7 @@ class SubmissionCommentHandler(BaseEventHandler):
     def _process_student_text(
         self, text: str, user: models.BotUser, submission: models.Submission
     ):
-        if self.run:
+        if self.should_apply(submission, 'comment'):
             tasks.process_student_pull_comment(
                 submission.id,
                 user.id,
@@ -122,7 +155,7 @@ class SubmissionPushHandler(BaseEventHandler):
         user, submission = self.get_user_and_submission()
 
         if not user.is_staff:
-            if self.run:
+            if self.should_apply(submission, 'push'):
                 tasks.process_student_push(
                     submission.id,
                     user.id,
@@ -136,7 +169,9 @@ class SubmissionCreatedHandler(BaseEventHandler):
         user, submission = self.get_user_and_submission()
         if submission.created_at != self.event.occured_at:
             submission.created_at = self.event.occured_at
-            submission.save()
+            models.Submission.objects.filter(id=submission.id).update(
+                created_at=self.event.occured_at
+            )
 
 
 class Command(BaseCommand):
@@ -149,39 +184,70 @@ class Command(BaseCommand):
         'submission.push': SubmissionPushHandler,
     }
 
+    errors_file = '_events_with_errors.jsonl'
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.errors = []
+        self.errors = 0
         self.ok = 0
+        self.total = 0
 
     def add_arguments(self, parser):
         parser.add_argument('--file', type=str, required=True)
         parser.add_argument('--run', action='store_true', default=False)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            default=False,
+            help='Continue from the checkpoint of the previous run',
+        )
 
     def handle(self, *args, **options):
         run = options['run']
-        with open(options['file']) as file:
-            for i, line in enumerate(file):
-                line = line.strip()
-                event = EventItem.from_dict(json.loads(line))
-                try:
-                    self.registry[event.type](event, run)()
-                    self.stdout.write(self.style.SUCCESS(f'# {i + 1}'))
-                    self.ok += 1
-                except Exception as exc:
-                    self.stdout.write(
-                        self.style.ERROR(f'ERROR [{event}]: {exc}')
-                    )
-                    self.errors.append((str(exc), line))
+        workers = options['workers']
+        # Dry runs keep their own checkpoint, a resumed real run must not
+        # skip events which were only checked
+        checkpoint_path = options['file'] + (
+            '.checkpoint' if run else '.dry-run.checkpoint'
+        )
+
+        offset = 0
+        if options['resume']:
+            offset = self._load_checkpoint(checkpoint_path)
+            self.stdout.write(
+                f'Resuming from byte {offset}, already processed: '
+                f'{self.total}'
+            )
+
+        started = time.monotonic()
+        processed_before = self.total
+        errors_mode = 'a' if options['resume'] else 'w'
+
+        with open(options['file'], 'rb') as file, open(
+            self.errors_file, errors_mode
+        ) as errors_file:
+            file.seek(offset)
+            batches = self._read_batches(file, offset, options['batch_size'])
+            for batch, offset in batches:
+                for error, line in self._apply_batch(batch, run, workers):
+                    errors_file.write(error + '\t' + line + '\n')
+                errors_file.flush()
+
+                self._save_checkpoint(checkpoint_path, offset)
+
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f'Processed: {self.total}, ok: {self.ok}, '
+                    f'errors: {self.errors}, '
+                    f'{(self.total - processed_before) / elapsed:.1f} events/s'
+                )
 
         if self.errors:
-            errors_file = '_events_with_errors.jsonl'
-            with open(errors_file, 'w') as file:
-                for error, line in self.errors:
-                    file.write(error + '\t' + line + '\n')
             self.stdout.write(
                 self.style.WARNING(
-                    f'Events with errors wrote in {errors_file}'
+                    f'Events with errors wrote in {self.errors_file}'
                 )
             )
 
@@ -189,3 +255,140 @@ class Command(BaseCommand):
             self.stdout.write(
                 self.style.SUCCESS(f'Applied successfully: {self.ok}')
             )
+
+    def _load_checkpoint(self, path: str) -> int:
+        try:
+            with open(path) as file:
+                checkpoint = json.load(file)
+        except FileNotFoundError:
+            return 0
+
+        self.total = checkpoint['total']
+        self.ok = checkpoint['ok']
+        self.errors = checkpoint['errors']
+        return checkpoint['offset']
+
+    def _save_checkpoint(self, path: str, offset: int) -> None:
+        checkpoint = {
+            'offset': offset,
+            'total': self.total,
+            'ok': self.ok,
+            'errors': self.errors,
+        }
+        # Replace atomically so a crash never leaves a torn checkpoint
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump(checkpoint, file)
+        os.replace(tmp_path, path)
+
+    def _read_batches(
+        self, file: tp.BinaryIO, offset: int, batch_size: int
+    ) -> tp.Iterator[tp.Tuple[tp.List[EventLine], int]]:
+        batch = []
+
+        for raw in file:
+            offset += len(raw)
+            line = raw.decode().strip()
+            if not line:
+                continue
+
+            item = EventLine(line=line)
+            try:
+                item.event = EventItem.from_dict(json.loads(line))
+            except Exception as exc:
+                item.error = f'Bad event: {exc}'
+            batch.append(item)
+
+            if len(batch) >= batch_size:
+                yield batch, offset
+                batch = []
+
+        if batch:
+            yield batch, offset
+
+    def _apply_batch(
+        self, batch: tp.List[EventLine], run: bool, workers: int
+    ) -> tp.List[tp.Tuple[str, str]]:
+        events = [item.event for item in batch if item.event is not None]
+
+        users = {
+            user.github_login_lower: user
+            for user in models.BotUser.objects.annotate(
+                github_login_lower=Lower('github_login')
+            ).filter(
+                github_login_lower__in={
+                    event.author.lower() for event in events
+                }
+            )
+        }
+        submissions = {
+            submission.pull_url: submission
+            for submission in models.Submission.objects.filter(
+                pull_url__in={event.pull_url for event in events}
+            )
+        }
+
+        applied = set()
+        if run:
+            applied = set(
+                models.SubmissionEvent.objects.filter(
+                    submission__in=[item.id for item in submissions.values()],
+                    occured_at__in={event.occured_at for event in events},
+                ).values_list('submission_id', 'event', 'occured_at')
+            )
+
+        # Events of one submission are applied in order by one worker
+        by_submission = collections.defaultdict(list)
+        for item in batch:
+            pull_url = item.event.pull_url if item.event else None
+            by_submission[pull_url].append(item)
+
+        groups = list(by_submission.values())
+        buckets = [groups[i::workers] for i in range(workers)]
+
+        with futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(
+                lambda bucket: self._apply_groups(
+                    bucket, run, users, submissions, applied
+                ),
+                buckets,
+            )
+            batch_errors = []
+            for ok, errors in results:
+                self.ok += ok
+                batch_errors.extend(errors)
+
+        self.total += len(batch)
+        self.errors += len(batch_errors)
+        return batch_errors
+
+    def _apply_groups(
+        self,
+        groups: tp.List[tp.List[EventLine]],
+        run: bool,
+        users: tp.Dict[str, models.BotUser],
+        submissions: tp.Dict[str, models.Submission],
+        applied: tp.Set[tp.Tuple[int, str, datetime.datetime]],
+    ) -> tp.Tuple[int, tp.List[tp.Tuple[str, str]]]:
+        ok = 0
+        errors = []
+
+        try:
+            for group in groups:
+                for item in group:
+                    if item.error is not None:
+                        errors.append((item.error, item.line))
+                        continue
+                    try:
+                        handler = self.registry[item.event.type]
+                        handler(
+                            item.event, run, users, submissions, applied
+                        )()
+                        ok += 1
+                    except Exception as exc:
+                        errors.append((str(exc), item.line))
+        finally:
+            # Every worker thread opens its own connection
+            connection.close()
+
+        return ok, errors
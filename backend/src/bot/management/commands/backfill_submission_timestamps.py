@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Subquery
+
+from bot import models
+
+
+class Command(BaseCommand):
+    help = 'Fill denormalized submission timestamps from events'
+
+    def handle(self, *args, **options):
+        events = models.SubmissionEvent.objects.filter(
+            submission=OuterRef('pk')
+        )
+        status_events = events.filter(event=OuterRef('status')).order_by(
+            '-occured_at'
+        )
+        review_events = events.filter(event__in=models.REVIEW_EVENTS)
+        first_review_events = review_events.order_by('occured_at')
+
+        with transaction.atomic():
+            updated = models.Submission.objects.update(
+                status_changed_at=Subquery(
+                    status_events.values('occured_at')[:1]
+                ),
+                first_reviewed_at=Subquery(
+                    first_review_events.values('occured_at')[:1]
+                ),
+                seen=Exists(review_events),
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Submissions updated: {updated}')
+        )
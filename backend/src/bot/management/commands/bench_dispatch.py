@@ -0,0 +1,66 @@
+import io
+import pathlib
+import time
+
+from django.core.management.base import BaseCommand
+
+from bot.api import parsers
+from bot.logic import gh
+
+
+RECORDED_PAYLOADS = pathlib.Path(__file__).parents[2].joinpath(
+    'tests', 'static', 'test_github_webhook'
+)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark GitHub webhook dispatch on recorded payloads'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'payloads',
+            nargs='*',
+            metavar='EVENT=FILE',
+            help='Recorded payloads with their X-GitHub-Event',
+        )
+        parser.add_argument('--iterations', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        dispatcher = gh.EventDispatcher()
+        parser = parsers.GithubWebhookParser()
+        iterations = options['iterations']
+
+        for event, body in self._load_payloads(options['payloads']):
+            headers = {gh.GITHUB_EVENT_HEADER: event}
+
+            started = time.perf_counter()
+            for _ in range(iterations):
+                if dispatcher.is_supported(headers):
+                    payload = parser.parse(
+                        io.BytesIO(body),
+                        parser_context={
+                            'fields': dispatcher.get_fields(headers)
+                        },
+                    )
+                    dispatcher.resolve(headers, payload)
+            elapsed = time.perf_counter() - started
+
+            self.stdout.write(
+                f'{event}: {len(body)} bytes, '
+                f'{iterations / elapsed:.0f} deliveries/s, '
+                f'{elapsed / iterations * 1e6:.1f} us/delivery'
+            )
+
+    def _load_payloads(self, payloads):
+        if not payloads:
+            payloads = [
+                f'{path.stem.replace("_payload", "")}={path}'
+                for path in sorted(RECORDED_PAYLOADS.glob('*_payload.json'))
+            ]
+            # Unsupported events must be dropped without parsing the body
+            payloads.append(f'watch={payloads[0].split("=", 1)[1]}')
+
+        for item in payloads:
+            event, path = item.split('=', 1)
+            with open(path, 'rb') as file:
+                yield event, file.read()
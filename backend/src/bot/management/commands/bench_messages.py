@@ -0,0 +1,66 @@
+import string
+import time
+
+from django.core.management.base import BaseCommand
+from telegram.utils import helpers as telegram_helpers
+
+from bot.logic import helpers
+
+
+class _Fields:
+    def __getattr__(self, name):
+        return 0
+
+
+def _sample_kwargs(template: str) -> dict:
+    kwargs = {}
+
+    for _, field, _, _ in string.Formatter().parse(template):
+        if not field:
+            continue
+        name, _, attr = field.partition('.')
+        kwargs[name] = _Fields() if attr else 'Пупкин Иван (group_1.2)'
+
+    return kwargs
+
+
+class Command(BaseCommand):
+    help = 'Benchmark rendering of bot messages'
+
+    def add_arguments(self, parser):
+        parser.add_argument('aliases', nargs='*')
+        parser.add_argument('--iterations', type=int, default=100000)
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        aliases = options['aliases'] or list(helpers.MESSAGES)
+
+        for alias in aliases:
+            kwargs = _sample_kwargs(helpers.MESSAGES[alias])
+
+            started = time.perf_counter()
+            for _ in range(iterations):
+                helpers.get_message(alias, **kwargs)
+            elapsed = time.perf_counter() - started
+
+            self._report(alias, iterations, elapsed)
+
+        text = 'Пупкин Иван (group_1.2) [hw-1]!'
+        for name, escape in (
+            ('escape_markdown', helpers.escape_markdown),
+            (
+                'telegram escape_markdown',
+                lambda value: telegram_helpers.escape_markdown(
+                    value, version=2
+                ),
+            ),
+        ):
+            started = time.perf_counter()
+            for _ in range(iterations):
+                escape(text)
+            elapsed = time.perf_counter() - started
+
+            self._report(name, iterations, elapsed)
+
+    def _report(self, name: str, iterations: int, elapsed: float) -> None:
+        self.stdout.write(f'{name}: {elapsed / iterations * 1e6:.2f} us/call')
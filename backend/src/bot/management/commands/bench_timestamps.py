@@ -0,0 +1,88 @@
+import datetime
+import json
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+import dateparser
+
+from bot.management.commands import apply_events
+
+
+class Command(BaseCommand):
+    help = 'Benchmark occured_at parsing of apply_events on an event file'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--file',
+            type=str,
+            help='Events file, a synthetic one is generated if omitted',
+        )
+        parser.add_argument('--lines', type=int, default=1_000_000)
+        parser.add_argument(
+            '--dateparser-sample',
+            type=int,
+            default=10_000,
+            help='Lines parsed with plain dateparser for comparison',
+        )
+
+    def handle(self, *args, **options):
+        path = options['file']
+        generated = path is None
+        if generated:
+            path = self._generate(options['lines'])
+
+        try:
+            lines = 0
+            started = time.perf_counter()
+            with open(path) as file:
+                for line in file:
+                    apply_events.EventItem.from_dict(json.loads(line))
+                    lines += 1
+            elapsed = time.perf_counter() - started
+            self._report('parse_timestring', lines, elapsed)
+
+            sample = 0
+            started = time.perf_counter()
+            with open(path) as file:
+                for line in file:
+                    if sample >= options['dateparser_sample']:
+                        break
+                    data = json.loads(line)
+                    dateparser.parse(data['occured_at'])
+                    sample += 1
+            elapsed = time.perf_counter() - started
+            if sample:
+                self._report('dateparser', sample, elapsed)
+        finally:
+            if generated:
+                os.remove(path)
+
+    def _report(self, name: str, lines: int, elapsed: float) -> None:
+        self.stdout.write(
+            f'{name}: {lines} lines in {elapsed:.2f}s, '
+            f'{lines / elapsed:.0f} lines/s, '
+            f'{elapsed / lines * 1e6:.1f} us/line'
+        )
+
+    def _generate(self, lines: int) -> str:
+        started = datetime.datetime(2020, 9, 1, tzinfo=datetime.timezone.utc)
+        file = tempfile.NamedTemporaryFile(
+            'w', suffix='.jsonl', delete=False
+        )
+        with file:
+            for i in range(lines):
+                occured_at = started + datetime.timedelta(seconds=i * 7)
+                event = {
+                    'type': 'submission.comment',
+                    'pull_url': f'https://github.com/org/repo/pull/{i % 500}',
+                    'body': 'text',
+                    'author': 'student',
+                    'occured_at': occured_at.isoformat().replace(
+                        '+00:00', 'Z'
+                    ),
+                    'repo': 'org/repo',
+                }
+                file.write(json.dumps(event) + '\n')
+        return file.name
@@ -1,87 +1,174 @@
-import collections
+import csv
+import itertools
+import sys
+import typing as tp
 
 from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db.models import IntegerField
+from django.db.models import OuterRef
+from django.db.models import Subquery
+from django.db.models import TextField
+from django.db.models import Value
+from django.db.models.fields.json import KeyTextTransform
+from django.db.models.functions import Cast
+from django.db.models.functions import Concat
 from django.utils import timezone
 
 from bot import models
 
 
+HEADERS = [
+    'submission_id',
+    'assignment_type',
+    'assignment_name',
+    'task_id',
+    'status',
+    'pull_url',
+    'submission_author',
+    'accepted_at',
+    'accepted_by',
+]
+
+DELIMITERS = {
+    'tsv': '\t',
+    'csv': ',',
+}
+
+
+def _full_name(prefix: str = '') -> Concat:
+    return Concat(
+        f'{prefix}last_name',
+        Value(' '),
+        f'{prefix}first_name',
+        output_field=TextField(),
+    )
+
+
 class Command(BaseCommand):
     help = 'List submissions'
 
     def add_arguments(self, parser):
         parser.add_argument('--groups', nargs='+', type=int)
+        parser.add_argument(
+            '--format',
+            choices=['tsv', 'csv', 'parquet'],
+            default='tsv',
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            help='Output file, stdout if omitted',
+        )
+        parser.add_argument('--chunk-size', type=int, default=2000)
 
     def handle(self, *args, **options):
-        kwrags = {}
-
-        if options['groups']:
-            kwrags['author__groups__in'] = options['groups']
-
-        cols = [
-            'id',
-            'real_assignment__type',
-            'real_assignment__name',
-            'task_id',
-            'status',
-            'pull_url',
-            'author__id',
-        ]
-
-        headers = [
-            'submission_id',
-            'assignment_type',
-            'assignment_name',
-            'task_id',
-            'status',
-            'pull_url',
-            'submission_author',
-            'accepted_at',
-            'accepted_by',
-        ]
-
-        rows = models.Submission.objects.filter(**kwrags).values(*cols)
-        events = self._get_events(rows)
-        all_users = self._get_users()
-
-        print(*headers, sep='\t')
-
-        for row in rows:
-            items = []
-            for col in cols:
-                item = row[col]
-                if col in ['author__id']:
-                    item = all_users[row[col]].full_name
-                items.append(item)
-            submission_events = events.get(row['id'], [])
+        rows = self._get_rows(options['groups'], options['chunk_size'])
+
+        if options['format'] == 'parquet':
+            if not options['output']:
+                raise CommandError('Parquet export requires --output')
+            self._write_parquet(rows, options['output'], options['chunk_size'])
+            return
+
+        delimiter = DELIMITERS[options['format']]
+        if options['output']:
+            with open(options['output'], 'w', newline='') as file:
+                self._write_delimited(rows, file, delimiter)
+        else:
+            self._write_delimited(rows, sys.stdout, delimiter)
+
+    def _get_rows(
+        self, groups: tp.Optional[tp.List[int]], chunk_size: int
+    ) -> tp.Iterator[tuple]:
+        submissions = models.Submission.objects.all()
+
+        if groups:
+            submissions = submissions.filter(
+                author__in=models.BotUser.objects.filter(
+                    groups__in=groups
+                ).values('id')
+            )
+
+        accepted = models.SubmissionEvent.objects.filter(
+            submission=OuterRef('id'),
+            event=models.SubmissionStatus.Accepted.value,
+        ).order_by('-occured_at')
+        accepted_by = (
+            models.BotUser.objects.filter(id=OuterRef('accepted_by_id'))
+            .annotate(full_name=_full_name())
+            .values('full_name')
+        )
+
+        rows = (
+            submissions.annotate(
+                author_name=_full_name('author__'),
+                accepted_at=Subquery(accepted.values('occured_at')[:1]),
+                accepted_by_id=Subquery(
+                    accepted.annotate(
+                        accepted_by=Cast(
+                            KeyTextTransform('accepted_by', 'payload'),
+                            IntegerField(),
+                        )
+                    ).values('accepted_by')[:1]
+                ),
+            )
+            .annotate(accepted_by_name=Subquery(accepted_by[:1]))
+            .order_by('id')
+            .values_list(
+                'id',
+                'real_assignment__type',
+                'real_assignment__name',
+                'task_id',
+                'status',
+                'pull_url',
+                'author_name',
+                'accepted_at',
+                'accepted_by_name',
+            )
+        )
+
+        for row in rows.iterator(chunk_size=chunk_size):
+            *items, accepted_at, accepted_by_name = row
             if (
-                submission_events
-                and row['status'] == models.SubmissionStatus.Accepted.value
+                accepted_at is not None
+                and row[4] == models.SubmissionStatus.Accepted.value
             ):
-                accepted_event = submission_events[-1]
-
-                items.append(
-                    timezone.localtime(accepted_event.occured_at).isoformat()
+                items.append(timezone.localtime(accepted_at).isoformat())
+                items.append(accepted_by_name)
+            else:
+                items.extend([None, None])
+            yield tuple(items)
+
+    def _write_delimited(
+        self, rows: tp.Iterator[tuple], file: tp.TextIO, delimiter: str
+    ) -> None:
+        writer = csv.writer(file, delimiter=delimiter, lineterminator='\n')
+        writer.writerow(HEADERS)
+        writer.writerows(rows)
+
+    def _write_parquet(
+        self, rows: tp.Iterator[tuple], path: str, chunk_size: int
+    ) -> None:
+        # Heavy imports, only when parquet is exported
+        import pyarrow
+        from pyarrow import parquet
+
+        schema = pyarrow.schema(
+            [
+                (name, pyarrow.int64())
+                if name in ('submission_id', 'task_id')
+                else (name, pyarrow.string())
+                for name in HEADERS
+            ]
+        )
+
+        with parquet.ParquetWriter(path, schema) as writer:
+            while True:
+                chunk = list(itertools.islice(rows, chunk_size))
+                if not chunk:
+                    break
+                columns = [list(column) for column in zip(*chunk)]
+                writer.write_table(
+                    pyarrow.Table.from_arrays(columns, schema=schema)
                 )
-
-                items.append(
-                    all_users[
-                        accepted_event.payload.get('accepted_by')
-                    ].full_name
-                    if accepted_event.payload
-                    else None
-                )
-
-            print(*items, sep='\t')
-
-    def _get_events(self, rows):
-        events_by_submission = collections.defaultdict(list)
-        events = models.SubmissionEvent.objects.filter(
-            submission__in=[it['id'] for it in rows], event__in=['accepted']
-        ).order_by('occured_at')
-        for event in events:
-            events_by_submission[event.submission.id].append(event)
-        return events_by_submission
-
-    def _get_users(self):
-        return {user.id: user for user in models.BotUser.objects.all()}
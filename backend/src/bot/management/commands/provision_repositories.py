@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from bot.logic import provisioning
+
+
+class Command(BaseCommand):
+    help = 'Create assignment repositories for registered students'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', nargs='+', type=int)
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument(
+            '--rate',
+            type=float,
+            default=1.0,
+            help='Repositories per second across all workers',
+        )
+
+    def handle(self, *args, **options):
+        result = provisioning.provision_repositories(
+            options['users'], options['workers'], options['rate']
+        )
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Repositories created: {result.created}')
+        )
+        if result.failed:
+            self.stdout.write(
+                self.style.ERROR(f'Failed for users: {result.failed}')
+            )
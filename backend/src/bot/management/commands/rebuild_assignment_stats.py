@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from bot import models
+
+
+class Command(BaseCommand):
+    help = 'Recount assignment stats from submissions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--assignments', nargs='+', type=int)
+
+    def handle(self, *args, **options):
+        rows = models.AssignmentStats.rebuild(options['assignments'])
+        self.stdout.write(self.style.SUCCESS(f'Stats rebuilt: {rows} rows'))
@@ -0,0 +1,28 @@
+# Generated by Django 3.1.2 on 2026-10-19 18:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0013_auto_20201115_1910'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='first_reviewed_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='seen',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='status_changed_at',
+            field=models.DateTimeField(db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.1.2 on 2026-10-19 18:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0014_submission_status_timestamps'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['repository', 'git_ref'], name='submission_repo_ref_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['real_assignment', 'status'], name='submission_asgn_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['author', 'real_assignment'], name='submission_author_asgn_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(condition=models.Q(status='review'), fields=['real_assignment', 'task_id', 'id'], name='submission_review_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='submissionevent',
+            index=models.Index(fields=['submission', 'event', 'occured_at'], name='subevent_sub_event_at_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.1.2 on 2026-10-19 18:17
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0015_submission_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='submissionevent',
+            name='occured_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
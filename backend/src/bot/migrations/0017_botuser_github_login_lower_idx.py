@@ -0,0 +1,16 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0016_submissionevent_occured_at_default'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX bot_botuser_github_login_lower_idx '
+            'ON bot_botuser (lower(github_login));',
+            reverse_sql='DROP INDEX bot_botuser_github_login_lower_idx;',
+        ),
+    ]
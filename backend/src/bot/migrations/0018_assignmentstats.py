@@ -0,0 +1,38 @@
+# Generated by Django 3.1.2 on 2026-10-19 18:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0017_botuser_github_login_lower_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssignmentStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task_id', models.IntegerField()),
+                ('status', models.TextField()),
+                ('count', models.IntegerField(default=0)),
+                ('assignment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='bot.assignment')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='assignmentstats',
+            constraint=models.UniqueConstraint(fields=('assignment', 'task_id', 'status'), name='asgn_stats_task_status'),
+        ),
+        migrations.RunSQL(
+            sql="""
+                INSERT INTO bot_assignmentstats (assignment_id, task_id, status, count)
+                SELECT real_assignment_id, task_id, status, COUNT(*)
+                FROM bot_submission
+                WHERE real_assignment_id IS NOT NULL
+                GROUP BY real_assignment_id, task_id, status
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.1.2 on 2026-10-19 18:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0018_assignmentstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GistRevision',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gist_id', models.TextField(unique=True)),
+                ('revision', models.TextField()),
+                ('etag', models.TextField(null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='assignmentgistcache',
+            name='revision',
+            field=models.TextField(null=True),
+        ),
+        # Gists cached before revisions were tracked keep serving their
+        # content until the first refresh
+        migrations.RunSQL(
+            sql="""
+                INSERT INTO bot_gistrevision (gist_id, revision, updated_at)
+                SELECT DISTINCT gist_id, '', NOW() FROM bot_assignmentgistcache
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 3.1.2 on 2026-10-19 18:31
+
+import re
+
+from django.db import migrations, models
+
+
+def fill_task_ids(apps, schema_editor):
+    Assignment = apps.get_model('bot', 'Assignment')
+    AssignmentGistCache = apps.get_model('bot', 'AssignmentGistCache')
+
+    for assignment in Assignment.objects.all():
+        match = re.search(
+            r'gist\.github\.com/[^/]+/([a-z0-9]+)', assignment.gist_url, re.I
+        )
+        if not match:
+            continue
+        assignment.task_ids = list(
+            AssignmentGistCache.objects.filter(gist_id=match.group(1))
+            .order_by('task_id')
+            .values_list('task_id', flat=True)
+        )
+        assignment.tasks_count = len(assignment.task_ids)
+        assignment.save(update_fields=['task_ids', 'tasks_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0019_gist_revisions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assignment',
+            name='task_ids',
+            field=models.JSONField(default=list),
+        ),
+        migrations.AddField(
+            model_name='assignment',
+            name='tasks_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(fill_task_ids, migrations.RunPython.noop),
+    ]
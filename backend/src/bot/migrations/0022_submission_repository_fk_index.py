@@ -0,0 +1,19 @@
+# Generated by Django 3.1.2 on 2026-10-19 20:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0021_shared_cache_table'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='submission',
+            name='repository',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='bot.githubrepository'),
+        ),
+    ]
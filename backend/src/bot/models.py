@@ -5,8 +5,11 @@ import re
 import typing as tp
 
 from django.conf import settings
+from django.db import connection
 from django.db import models
 from django.db import transaction
+from django.db.models.functions import Lower
+from django.dispatch import Signal
 from django.utils import timezone
 
 
@@ -35,6 +38,39 @@ class SubmissionStatus(enum.Enum):
     Accepted = 'accepted'
 
 
+# Target status -> statuses the submission may be moved from
+SUBMISSION_TRANSITIONS = {
+    SubmissionStatus.Processing: {
+        SubmissionStatus.Pending,
+        SubmissionStatus.Processing,
+    },
+    SubmissionStatus.Review: {
+        SubmissionStatus.Processing,
+        SubmissionStatus.Needwork,
+    },
+    # Repeated change requests are recorded and notified again
+    SubmissionStatus.Needwork: {
+        SubmissionStatus.Review,
+        SubmissionStatus.Needwork,
+        SubmissionStatus.Accepted,
+    },
+    SubmissionStatus.Accepted: {
+        SubmissionStatus.Review,
+        SubmissionStatus.Needwork,
+    },
+}
+
+# Events which mean that staff has looked at the submission
+REVIEW_EVENTS = {
+    SubmissionStatus.Needwork.value,
+    SubmissionStatus.Accepted.value,
+}
+
+# Sent by Submission.transition with submission_id, status, pull_url,
+# repository_id and git_ref of the moved submission
+submission_transitioned = Signal()
+
+
 class AssignmentType(enum.Enum):
     Homework = 'homework'
     Test = 'test'
@@ -65,6 +101,13 @@ class BotUser(models.Model):
     def get_or_none(cls, telegram_chat_id: int) -> tp.Optional['BotUser']:
         return cls.objects.filter(telegram_chat_id=telegram_chat_id).first()
 
+    @classmethod
+    def filter_by_github_login(cls, github_login: str) -> models.QuerySet:
+        # Uses functional index on lower(github_login)
+        return cls.objects.annotate(
+            github_login_lower=Lower('github_login')
+        ).filter(github_login_lower=github_login.lower())
+
     @property
     def full_name(self) -> str:
         return f'{self.last_name} {self.first_name}'
@@ -123,6 +166,24 @@ class GithubRepository(models.Model):
         return self.__str__()
 
 
+class GistRevision(models.Model):
+    """Revision of a gist whose files are in AssignmentGistCache"""
+
+    gist_id = models.TextField(unique=True)
+    revision = models.TextField()
+    etag = models.TextField(null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return (
+            f'GistRevision[gist_id={self.gist_id},'
+            f'revision={self.revision}]'
+        )
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
 class AssignmentGistCache(models.Model):
     class Meta:
         constraints = [
@@ -134,6 +195,7 @@ class AssignmentGistCache(models.Model):
     gist_id = models.TextField()
     task_id = models.IntegerField()
     content = models.TextField()
+    revision = models.TextField(null=True)
 
     def __str__(self) -> str:
         return (
@@ -144,40 +206,6 @@ class AssignmentGistCache(models.Model):
     def __repr__(self) -> str:
         return self.__str__()
 
-    @classmethod
-    def cache_gist(
-        cls, gist_id: str, return_task_id: tp.Optional[int] = None
-    ) -> tp.Optional[str]:
-        from bot.logic import gh  # to prevent ring dependencies
-
-        filename_pattern = r'([0-9]+)\.md'
-
-        gist = gh.get_gist(gist_id)
-
-        cache = {}
-
-        for filename, gist_file in gist.files.items():
-            match = re.match(filename_pattern, filename)
-            if not match:
-                logger.warning('Bad filename %s in gist %s', filename, gist)
-                continue
-            cache[int(match.group(1))] = gist_file.content
-
-        logger.info('Cache for storing: %s', cache)
-
-        cls.objects.bulk_create(
-            [
-                cls(gist_id=gist_id, task_id=task_id, content=content)
-                for task_id, content in cache.items()
-            ],
-            ignore_conflicts=True,
-        )
-
-        logger.info('return_task_id: %s', return_task_id)
-
-        if return_task_id is not None:
-            return cache[return_task_id]
-
     @classmethod
     def parse_gist_url(cls, gist_url: str) -> str:
         regexp = r'gist\.github\.com/[^/]+/([a-z0-9]+)'
@@ -197,6 +225,10 @@ class Assignment(models.Model):
     seq = models.IntegerField()
     created_at = models.DateTimeField(auto_now_add=timezone.now)
 
+    # Denormalized from the gist: maintained by gists.refresh_gist
+    task_ids = models.JSONField(default=list)
+    tasks_count = models.IntegerField(default=0)
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
@@ -209,17 +241,19 @@ class Assignment(models.Model):
             )
         ]
 
-    @property
-    def tasks_count(self):
-        gist_id = AssignmentGistCache.parse_gist_url(self.gist_url)
-        return AssignmentGistCache.objects.filter(gist_id=gist_id).count()
-
     @classmethod
     def get_available_for_user(
         cls, user: BotUser, assignment_type: tp.Optional[AssignmentType] = None
     ):
-        user_groups = user.groups
-        kwargs = {'group__in': user_groups.all(), 'is_enabled': True}
+        return cls.get_available_for_groups(user.groups.all(), assignment_type)
+
+    @classmethod
+    def get_available_for_groups(
+        cls,
+        groups: tp.Iterable[int],
+        assignment_type: tp.Optional[AssignmentType] = None,
+    ):
+        kwargs = {'group__in': groups, 'is_enabled': True}
         if assignment_type:
             kwargs['type'] = assignment_type.value
         return cls.objects.filter(**kwargs)
@@ -235,12 +269,110 @@ class Assignment(models.Model):
         return self.__str__()
 
 
+class AssignmentStats(models.Model):
+    """Submission counts per task and status
+
+    Maintained by Submission.transition and the submission signals,
+    rebuild with ``manage.py rebuild_assignment_stats`` after manual edits.
+    """
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['assignment', 'task_id', 'status'],
+                name='asgn_stats_task_status',
+            )
+        ]
+
+    assignment = models.ForeignKey(
+        Assignment, on_delete=models.CASCADE, related_name='stats'
+    )
+    task_id = models.IntegerField()
+    status = models.TextField()
+    count = models.IntegerField(default=0)
+
+    def __str__(self) -> str:
+        return (
+            f'AssignmentStats[assignment_id={self.assignment_id},'
+            f'task_id={self.task_id},status={self.status},'
+            f'count={self.count}]'
+        )
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    @classmethod
+    def get_counts(cls, assignment_id: int) -> tp.Dict[str, int]:
+        return dict(
+            cls.objects.filter(assignment_id=assignment_id)
+            .values_list('status')
+            .annotate(total=models.Sum('count'))
+        )
+
+    @classmethod
+    def add(
+        cls, assignment_id: int, task_id: int, status: str, delta: int
+    ) -> None:
+        stats = cls.objects.filter(
+            assignment_id=assignment_id, task_id=task_id, status=status
+        )
+        if stats.update(count=models.F('count') + delta) or delta < 0:
+            return
+
+        _, created = cls.objects.get_or_create(
+            assignment_id=assignment_id,
+            task_id=task_id,
+            status=status,
+            defaults={'count': delta},
+        )
+        if not created:
+            stats.update(count=models.F('count') + delta)
+
+    @classmethod
+    @transaction.atomic
+    def rebuild(cls, assignment_ids: tp.Optional[tp.List[int]] = None) -> int:
+        submissions = Submission.objects.filter(real_assignment__isnull=False)
+        stats = cls.objects.all()
+
+        if assignment_ids:
+            submissions = submissions.filter(
+                real_assignment__in=assignment_ids
+            )
+            stats = stats.filter(assignment__in=assignment_ids)
+
+        stats.delete()
+
+        rows = cls.objects.bulk_create(
+            cls(
+                assignment_id=item['real_assignment'],
+                task_id=item['task_id'],
+                status=item['status'],
+                count=item['total'],
+            )
+            for item in submissions.values(
+                'real_assignment', 'task_id', 'status'
+            )
+            .annotate(total=models.Count('id'))
+            .order_by()
+        )
+
+        return len(rows)
+
+
 class SubmissionEvent(models.Model):
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['submission', 'event', 'occured_at'],
+                name='subevent_sub_event_at_idx',
+            )
+        ]
+
     submission = models.ForeignKey(
         'Submission', on_delete=models.CASCADE, related_name='events'
     )
     event = models.TextField()
-    occured_at = models.DateTimeField(auto_now_add=timezone.now)
+    occured_at = models.DateTimeField(default=timezone.now)
     payload = models.JSONField(null=True)
 
     def __str__(self) -> str:
@@ -268,14 +400,34 @@ class Submission(models.Model):
                 name='unq_type_assignment_task',
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['repository', 'git_ref'],
+                name='submission_repo_ref_idx',
+            ),
+            models.Index(
+                fields=['real_assignment', 'status'],
+                name='submission_asgn_status_idx',
+            ),
+            models.Index(
+                fields=['author', 'real_assignment'],
+                name='submission_author_asgn_idx',
+            ),
+            models.Index(
+                fields=['real_assignment', 'task_id', 'id'],
+                name='submission_review_idx',
+                condition=models.Q(status=SubmissionStatus.Review.value),
+            ),
+        ]
 
     author = models.ForeignKey(BotUser, on_delete=models.CASCADE)
     task_id = models.IntegerField(db_index=True)
     status = models.TextField()
     objectkey = models.TextField()
     created_at = models.DateTimeField(auto_now_add=timezone.now)
+    # Leads submission_repo_ref_idx, which serves the FK lookups as well
     repository = models.ForeignKey(
-        GithubRepository, on_delete=models.CASCADE, null=True
+        GithubRepository, on_delete=models.CASCADE, null=True, db_index=False
     )
     pull_url = models.TextField(null=True, db_index=True)
     git_ref = models.TextField(null=True)
@@ -290,6 +442,11 @@ class Submission(models.Model):
         Assignment, on_delete=models.CASCADE, null=True
     )
 
+    # Denormalized from events: maintained by create_event
+    status_changed_at = models.DateTimeField(null=True, db_index=True)
+    first_reviewed_at = models.DateTimeField(null=True)
+    seen = models.BooleanField(default=False)
+
     def __str__(self) -> str:
         return (
             f'Submission[id={self.id},status={self.status},'
@@ -309,17 +466,13 @@ class Submission(models.Model):
     def assignment_name(self) -> str:
         return self.real_assignment.name if self.real_assignment else '-'
 
-    def get_task_content(self) -> str:
+    def get_task_content(self) -> tp.Optional[str]:
+        from bot.logic import gists  # to prevent ring dependencies
+
         gist_id = AssignmentGistCache.parse_gist_url(
             self.real_assignment.gist_url
         )
-        try:
-            entry = AssignmentGistCache.objects.get(
-                gist_id=gist_id, task_id=self.task_id
-            )
-            return entry.content
-        except AssignmentGistCache.DoesNotExist:
-            return AssignmentGistCache.cache_gist(gist_id, self.task_id)
+        return gists.get_task_content(gist_id, self.task_id)
 
     @transaction.atomic
     def create_event(
@@ -327,20 +480,210 @@ class Submission(models.Model):
         event: str,
         payload: tp.Optional[dict] = None,
         occured_at: tp.Optional[datetime.datetime] = None,
+        **fields,
     ) -> None:
         if payload is not None:
             assert isinstance(payload, dict), 'Payload must be dict'
 
-        event = SubmissionEvent.objects.create(
-            submission=self, event=event, payload=payload
+        if occured_at is None:
+            occured_at = timezone.now()
+
+        SubmissionEvent.objects.create(
+            submission_id=self.id,
+            event=event,
+            payload=payload,
+            occured_at=occured_at,
+        )
+
+        for name, value in fields.items():
+            setattr(self, name, value)
+
+        event_fields = self._get_event_fields(event, occured_at)
+        for name, value in event_fields.items():
+            setattr(self, name, value)
+        fields.update(event_fields)
+
+        if fields:
+            Submission.objects.filter(id=self.id).update(**fields)
+
+    @classmethod
+    def transition(
+        cls,
+        submission_id: int,
+        status: SubmissionStatus,
+        event: tp.Optional[str] = None,
+        payload: tp.Optional[dict] = None,
+        occured_at: tp.Optional[datetime.datetime] = None,
+        from_statuses: tp.Optional[tp.Iterable[SubmissionStatus]] = None,
+        **fields,
+    ) -> bool:
+        # Compare-and-set: update and event insert are one statement, so
+        # concurrent transitions can not overwrite each other.
+        # from_statuses narrows SUBMISSION_TRANSITIONS for a caller
+        if payload is not None:
+            assert isinstance(payload, dict), 'Payload must be dict'
+
+        if occured_at is None:
+            occured_at = timezone.now()
+
+        qn = connection.ops.quote_name
+
+        fields['status'] = status.value
+        fields['status_changed_at'] = occured_at
+
+        assignments = []
+        params = []
+
+        for name, value in fields.items():
+            field = cls._meta.get_field(name)
+            if isinstance(value, models.Model):
+                value = value.pk
+            assignments.append(f'{qn(field.column)} = %s')
+            params.append(field.get_db_prep_save(value, connection))
+
+        if status.value in REVIEW_EVENTS:
+            assignments.append(
+                'first_reviewed_at = LEAST(first_reviewed_at, %s)'
+            )
+            assignments.append('seen = TRUE')
+            params.append(occured_at)
+
+        table = qn(cls._meta.db_table)
+        stats_table = qn(AssignmentStats._meta.db_table)
+
+        # The self-join exposes the status being replaced, so the assignment
+        # stats are moved in the same statement. There is no SELECT ... FOR
+        # UPDATE, only the UPDATE locks the matched row: a row changed
+        # concurrently fails the s.status = old.status recheck, and the
+        # transition is rejected like any other lost compare-and-set
+        sql = (
+            'WITH updated AS ('
+            f'UPDATE {table} AS s SET {", ".join(assignments)} '
+            f'FROM (SELECT id, status FROM {table} WHERE id = %s) AS old '
+            'WHERE s.id = old.id AND s.status = old.status '
+            'AND s.status IN %s '
+            'RETURNING s.id, s.real_assignment_id, s.task_id, '
+            's.pull_url, s.repository_id, s.git_ref, '
+            'old.status AS old_status), '
+            'stats_out AS ('
+            f'UPDATE {stats_table} AS st SET count = st.count - 1 '
+            'FROM updated WHERE st.assignment_id = updated.real_assignment_id '
+            'AND st.task_id = updated.task_id '
+            'AND st.status = updated.old_status '
+            'AND updated.old_status <> %s), '
+            'stats_in AS ('
+            f'INSERT INTO {stats_table} '
+            '(assignment_id, task_id, status, count) '
+            'SELECT real_assignment_id, task_id, %s, 1 FROM updated '
+            'WHERE real_assignment_id IS NOT NULL AND old_status <> %s '
+            'ON CONFLICT (assignment_id, task_id, status) '
+            f'DO UPDATE SET count = {stats_table}.count + 1)'
+        )
+        params.append(submission_id)
+        if from_statuses is None:
+            from_statuses = SUBMISSION_TRANSITIONS[status]
+        params.append(tuple(item.value for item in from_statuses))
+        params.extend([status.value] * 3)
+
+        if event is not None:
+            payload_field = SubmissionEvent._meta.get_field('payload')
+            sql += (
+                ', event AS ('
+                f'INSERT INTO {qn(SubmissionEvent._meta.db_table)} '
+                '(submission_id, event, payload, occured_at) '
+                'SELECT id, %s, %s::jsonb, %s FROM updated)'
+            )
+            params.extend(
+                [
+                    event,
+                    payload_field.get_db_prep_save(payload, connection),
+                    occured_at,
+                ]
+            )
+
+        sql += ' SELECT pull_url, repository_id, git_ref FROM updated'
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+
+        if row is None:
+            logger.info(
+                'Submission %s can not be moved to %s', submission_id, status
+            )
+            return False
+
+        # Raw SQL sends no post_save, routes are invalidated by this signal
+        submission_transitioned.send(
+            sender=cls,
+            submission_id=submission_id,
+            status=status,
+            pull_url=row[0],
+            repository_id=row[1],
+            git_ref=row[2],
         )
 
-        if occured_at is not None:
-            event.occured_at = occured_at
-            event.save()
+        return True
+
+    def _get_event_fields(
+        self, event: str, occured_at: datetime.datetime
+    ) -> dict:
+        fields = {}
+
+        if event == self.status:
+            fields['status_changed_at'] = occured_at
 
-        self.events.add(event)
-        self.save()
+        if event in REVIEW_EVENTS:
+            if (
+                self.first_reviewed_at is None
+                or occured_at < self.first_reviewed_at
+            ):
+                fields['first_reviewed_at'] = occured_at
+            if not self.seen:
+                fields['seen'] = True
+
+        return fields
+
+    @classmethod
+    def get_for_review(cls, groups: tp.Iterable[int]) -> models.QuerySet:
+        return cls.objects.filter(
+            author__in=BotUser.objects.filter(groups__in=groups),
+            status=SubmissionStatus.Review.value,
+            real_assignment__isnull=False,
+        )
+
+    @classmethod
+    def get_review_page(
+        cls,
+        groups: tp.Iterable[int],
+        after: tp.Optional[tp.Tuple[int, int, int]] = None,
+        limit: int = 50,
+    ) -> tp.List['Submission']:
+        submissions = (
+            cls.get_for_review(groups)
+            .select_related('author', 'real_assignment')
+            .order_by('real_assignment_id', 'task_id', 'id')
+        )
+
+        if after is not None:
+            assignment_id, task_id, submission_id = after
+            submissions = submissions.filter(
+                models.Q(real_assignment_id__gt=assignment_id)
+                | models.Q(
+                    real_assignment_id=assignment_id, task_id__gt=task_id
+                )
+                | models.Q(
+                    real_assignment_id=assignment_id,
+                    task_id=task_id,
+                    id__gt=submission_id,
+                )
+            )
+
+        return list(submissions[:limit])
+
+    @property
+    def review_page_key(self) -> tp.Tuple[int, int, int]:
+        return self.real_assignment_id, self.task_id, self.id
 
     def get_staff(self):
         staff = BotUser.objects.filter(
@@ -351,20 +694,11 @@ class Submission(models.Model):
             staff = staff.exclude(id=self.author.id)
         return staff.distinct()
 
-    @property
-    def seen(self) -> str:
-        return self.events.filter(event__in=['needwork', 'accepted']).exists()
-
     @property
     def status_elapsed(self) -> tp.Optional[datetime.timedelta]:
-        status_event = (
-            self.events.filter(event=self.status)
-            .order_by('-occured_at')
-            .first()
-        )
-        if not status_event:
+        if self.status_changed_at is None:
             return None
-        return timezone.now() - status_event.occured_at
+        return timezone.now() - self.status_changed_at
 
 
 class GithubToken(models.Model):
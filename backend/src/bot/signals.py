@@ -0,0 +1,90 @@
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+)
+from django.dispatch import receiver
+
+from bot import models
+from bot.logic import helpers, keyboards, routing, user_context
+
+
+@receiver(post_save, sender=models.Submission)
+@receiver(post_delete, sender=models.Submission)
+def invalidate_submission_routes(sender, instance, **kwargs):
+    routing.invalidate_submission(instance)
+
+
+@receiver(models.submission_transitioned)
+def invalidate_transitioned_submission_routes(sender, pull_url, **kwargs):
+    routing.invalidate_routes(pull_url)
+
+
+@receiver(post_save, sender=models.BotUser)
+@receiver(post_delete, sender=models.BotUser)
+def invalidate_user_routes(sender, instance, **kwargs):
+    routing.invalidate_user(instance)
+
+
+@receiver(post_save, sender=models.Submission)
+def count_created_submission(sender, instance, created, **kwargs):
+    if created and instance.real_assignment_id is not None:
+        models.AssignmentStats.add(
+            instance.real_assignment_id, instance.task_id, instance.status, 1
+        )
+
+
+@receiver(post_delete, sender=models.Submission)
+def count_deleted_submission(sender, instance, **kwargs):
+    if instance.real_assignment_id is not None:
+        models.AssignmentStats.add(
+            instance.real_assignment_id, instance.task_id, instance.status, -1
+        )
+
+
+@receiver(post_save, sender=models.BotUser)
+@receiver(post_delete, sender=models.BotUser)
+def invalidate_user_context(sender, instance, **kwargs):
+    user_context.invalidate(instance.telegram_chat_id)
+
+
+@receiver(pre_delete, sender=models.Groups)
+def invalidate_group_users_context(sender, instance, **kwargs):
+    user_context.invalidate_users(
+        instance.users.values_list('id', flat=True)
+    )
+
+
+@receiver(m2m_changed, sender=models.Groups.users.through)
+def invalidate_group_membership_context(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+
+    if reverse:
+        # instance is a user, pk_set are groups
+        user_context.invalidate(instance.telegram_chat_id)
+    elif action == 'pre_clear':
+        invalidate_group_users_context(sender, instance)
+    else:
+        user_context.invalidate_users(pk_set)
+
+
+@receiver(post_save, sender=models.Groups)
+@receiver(post_delete, sender=models.Groups)
+def invalidate_groups_keyboards(sender, instance, **kwargs):
+    keyboards.bump_version(keyboards.GROUPS)
+
+
+@receiver(post_save, sender=models.Assignment)
+@receiver(post_delete, sender=models.Assignment)
+def invalidate_assignments_keyboards(sender, instance, **kwargs):
+    keyboards.bump_version(keyboards.ASSIGNMENTS)
+
+
+@receiver(post_save, sender=models.Assignment)
+@receiver(post_delete, sender=models.Assignment)
+def invalidate_commands_availability(sender, instance, **kwargs):
+    helpers.invalidate_availability(instance.group_id)
@@ -2,33 +2,79 @@ import datetime
 import logging
 import typing as tp
 
+from django.db import IntegrityError
+from django.db import transaction
+
+from app import exceptions
 from app.celery import celery
 from bot import models
+from bot.logic import gh
+from bot.logic import gists
+from bot.logic import helpers
+from bot.logic import keyboards
 from bot.logic import notify
 from bot.logic import processing
+from bot.logic import provisioning
+from bot.logic import user_context
 
 logger = logging.getLogger(__name__)
 
 
+def _get_submission(submission_id: int) -> models.Submission:
+    return models.Submission.objects.select_related(
+        'author', 'real_assignment'
+    ).get(id=submission_id)
+
+
 @celery.task
 def process_file(submission_id: int) -> None:
     processing.start_processing(submission_id)
 
 
+def _report_rejected_transition(
+    submission_id: int,
+    reviewer_id: tp.Optional[int],
+    status: models.SubmissionStatus,
+    need_notify: bool,
+) -> None:
+    # E.g. a command sent while the submission is still processing
+    submission = _get_submission(submission_id)
+    logger.warning(
+        'Submission %s in status %s is not moved to %s',
+        submission.id,
+        submission.status,
+        status.value,
+    )
+
+    if need_notify and reviewer_id is not None:
+        notify.notify_transition_rejected(
+            models.BotUser.objects.get(id=reviewer_id), submission, status
+        )
+
+
 @celery.task
 def process_needwork(
     submission_id: int,
     event_dt: tp.Optional[datetime.datetime] = None,
     need_notify: bool = True,
+    reviewer_id: tp.Optional[int] = None,
 ) -> None:
-    submission = models.Submission.objects.get(id=submission_id)
+    transitioned = models.Submission.transition(
+        submission_id,
+        models.SubmissionStatus.Needwork,
+        'needwork',
+        occured_at=event_dt,
+    )
 
-    submission.status = models.SubmissionStatus.Needwork.value
-    submission.save()
-    submission.create_event('needwork', occured_at=event_dt)
-
-    if need_notify:
-        notify.notify_needwork(submission)
+    if not transitioned:
+        _report_rejected_transition(
+            submission_id,
+            reviewer_id,
+            models.SubmissionStatus.Needwork,
+            need_notify,
+        )
+    elif need_notify:
+        notify.notify_needwork(_get_submission(submission_id))
 
 
 @celery.task
@@ -38,16 +84,23 @@ def process_accepted(
     event_dt: tp.Optional[datetime.datetime] = None,
     need_notify: bool = True,
 ) -> None:
-    submission = models.Submission.objects.get(id=submission_id)
-
-    submission.status = models.SubmissionStatus.Accepted.value
-    submission.save()
-    submission.create_event(
-        'accepted', payload={'accepted_by': accepted_by}, occured_at=event_dt
+    transitioned = models.Submission.transition(
+        submission_id,
+        models.SubmissionStatus.Accepted,
+        'accepted',
+        payload={'accepted_by': accepted_by},
+        occured_at=event_dt,
     )
 
-    if need_notify:
-        notify.notify_accepted(submission)
+    if not transitioned:
+        _report_rejected_transition(
+            submission_id,
+            accepted_by,
+            models.SubmissionStatus.Accepted,
+            need_notify,
+        )
+    elif need_notify:
+        notify.notify_accepted(_get_submission(submission_id))
 
 
 @celery.task
@@ -58,7 +111,7 @@ def process_student_pull_comment(
     event_dt: tp.Optional[datetime.datetime] = None,
     need_notify: bool = True,
 ) -> None:
-    submission = models.Submission.objects.get(id=submission_id)
+    submission = _get_submission(submission_id)
     commenter = models.BotUser.objects.get(id=commenter_id)
 
     submission.create_event(
@@ -67,10 +120,15 @@ def process_student_pull_comment(
         occured_at=event_dt,
     )
 
-    if submission.status == models.SubmissionStatus.Needwork.value:
-        submission.status = models.SubmissionStatus.Review.value
-        submission.save()
-        submission.create_event('review', occured_at=event_dt)
+    # Only a reviewed submission is reopened: while it is processing, the
+    # pull request and the branch are not saved yet
+    models.Submission.transition(
+        submission_id,
+        models.SubmissionStatus.Review,
+        'review',
+        occured_at=event_dt,
+        from_statuses=[models.SubmissionStatus.Needwork],
+    )
 
     if need_notify:
         notify.notify_student_comment(submission, commenter, text_fragment)
@@ -83,7 +141,7 @@ def process_student_push(
     event_dt: tp.Optional[datetime.datetime] = None,
     need_notify: bool = True,
 ) -> None:
-    submission = models.Submission.objects.get(id=submission_id)
+    submission = _get_submission(submission_id)
     user = models.BotUser.objects.get(id=user_id)
 
     submission.create_event(
@@ -92,10 +150,178 @@ def process_student_push(
         occured_at=event_dt,
     )
 
-    if submission.status == models.SubmissionStatus.Needwork.value:
-        submission.status = models.SubmissionStatus.Review.value
-        submission.save()
-        submission.create_event('review', occured_at=event_dt)
+    # Only a reviewed submission is reopened: while it is processing, the
+    # pull request and the branch are not saved yet
+    models.Submission.transition(
+        submission_id,
+        models.SubmissionStatus.Review,
+        'review',
+        occured_at=event_dt,
+        from_statuses=[models.SubmissionStatus.Needwork],
+    )
 
     if need_notify:
         notify.notify_student_push(submission, user)
+
+
+@celery.task
+def refresh_gist(gist_id: str, force: bool = False) -> None:
+    gists.refresh_gist(gist_id, force=force)
+
+
+@celery.task
+def refresh_gists() -> None:
+    gist_urls = (
+        models.Assignment.objects.filter(is_enabled=True)
+        .values_list('gist_url', flat=True)
+        .distinct()
+    )
+    for gist_url in gist_urls:
+        refresh_gist.delay(models.AssignmentGistCache.parse_gist_url(gist_url))
+
+
+@celery.task
+def import_assignment_gist(
+    chat_id: int,
+    message_id: int,
+    gist_url: str,
+    group_id: int,
+    assignment_type: str,
+    assignment_name: str,
+    owner_id: int,
+) -> None:
+    try:
+        _import_assignment_gist(
+            chat_id,
+            message_id,
+            gist_url,
+            group_id,
+            assignment_type,
+            assignment_name,
+            owner_id,
+        )
+    except Exception:
+        notify.notify_assignment_import_failed(
+            chat_id,
+            message_id,
+            'Не получилось загрузить gist. Попробуйте еще раз чуть позже.',
+        )
+        raise
+
+
+def _import_assignment_gist(
+    chat_id: int,
+    message_id: int,
+    gist_url: str,
+    group_id: int,
+    assignment_type: str,
+    assignment_name: str,
+    owner_id: int,
+) -> None:
+    try:
+        assignment, errors = gists.create_assignment(
+            gist_url, group_id, assignment_type, assignment_name, owner_id
+        )
+    except exceptions.BackendException:
+        notify.notify_assignment_import_failed(
+            chat_id,
+            message_id,
+            'Какой-то неправильный у вас gist. '
+            'Пришлите другую ссылку.',
+        )
+        return
+
+    if assignment is None:
+        notify.notify_assignment_import_failed(
+            chat_id,
+            message_id,
+            'Не смог найти ни одной задачи в вашем gist. '
+            'Пришлите другой.',
+            errors,
+        )
+        return
+
+    notify.notify_assignment_imported(
+        chat_id, message_id, assignment, errors
+    )
+
+
+@celery.task
+def register_github_login(
+    chat_id: int,
+    message_id: int,
+    user_id: int,
+    github_login: str,
+    telegram_login: tp.Optional[str],
+) -> None:
+    try:
+        _register_github_login(
+            chat_id, message_id, user_id, github_login, telegram_login
+        )
+    except Exception:
+        # The user waits for the edited message, it can not be left as is
+        notify.edit_message(
+            chat_id, message_id, helpers.get_message('error_retry')
+        )
+        raise
+
+
+def _register_github_login(
+    chat_id: int,
+    message_id: int,
+    user_id: int,
+    github_login: str,
+    telegram_login: tp.Optional[str],
+) -> None:
+    user = models.BotUser.objects.get(id=user_id)
+    if user.github_login:
+        # Registration of the name is done once, it is not taken over
+        notify.edit_message(
+            chat_id, message_id, helpers.get_message('already_registered')
+        )
+        return
+
+    try:
+        exists = gh.is_github_user(github_login)
+    except exceptions.BackendException:
+        notify.edit_message(
+            chat_id, message_id, helpers.get_message('cannot_chech_github')
+        )
+        return
+
+    if not exists:
+        msg = helpers.get_message(
+            'no_github_account', github_login=github_login
+        )
+        notify.edit_message(chat_id, message_id, msg, markdown=True)
+        return
+
+    user.telegram_chat_id = chat_id
+    user.github_login = github_login
+
+    if telegram_login:
+        user.telegram_login = telegram_login
+
+    try:
+        with transaction.atomic():
+            user.save()
+    except IntegrityError:
+        msg = helpers.get_message(
+            'github_login_taken', github_login=github_login
+        )
+        notify.edit_message(chat_id, message_id, msg, markdown=True)
+        return
+
+    notify.edit_message(
+        chat_id,
+        message_id,
+        helpers.get_message('welcome_to_do'),
+        reply_markup=keyboards.get_commands_keyboard(
+            user_context.get_user_context(chat_id)
+        ),
+    )
+
+
+@celery.task
+def provision_repositories() -> None:
+    provisioning.provision_repositories()
@@ -0,0 +1,127 @@
+from django.core.cache import cache
+import pytest
+
+from bot import models
+from bot import tasks
+from bot.logic import gh
+from bot.logic import gists
+from bot.logic import notify
+
+
+def test_refresh_gist_fetches_once_per_revision(db, monkeypatch):
+    cache.clear()
+    fetches = []
+
+    def fetch_gist(gist_id, etag=None):
+        fetches.append(etag)
+        if etag == 'etag-2':
+            return None
+        return gh.GistSnapshot(
+            revision=f'rev-{len(fetches)}',
+            etag=f'etag-{len(fetches)}',
+            files={'1.md': f'task {len(fetches)}', '2.md': ''},
+        )
+
+    monkeypatch.setattr(gh, 'fetch_gist', fetch_gist)
+
+    assert gists.get_task_content('abc', 1) == 'task 1'
+    assert gists.get_task_content('abc', 1) == 'task 1'
+    assert fetches == [None]
+
+    assert gists.refresh_gist('abc').changed
+    assert not gists.refresh_gist('abc').changed
+    assert fetches == [None, 'etag-1', 'etag-2']
+
+    assert gists.get_task_content('abc', 1) == 'task 2'
+    assert models.AssignmentGistCache.objects.get(task_id=1).revision == (
+        'rev-2'
+    )
+
+
+def test_refresh_gist_stores_task_ids(db, monkeypatch):
+    cache.clear()
+    owner = models.BotUser.objects.create(
+        first_name='petr',
+        last_name='petrov',
+        role=models.BotUserRole.Teacher.value,
+    )
+    assignment = models.Assignment.objects.create(
+        name='hw1',
+        type=models.AssignmentType.Homework.value,
+        gist_url='https://gist.github.com/petrov/abc',
+        owner=owner,
+        group=models.Groups.objects.create(id=202, name='test group'),
+        seq=1,
+    )
+    monkeypatch.setattr(
+        gh,
+        'fetch_gist',
+        lambda gist_id, etag=None: gh.GistSnapshot(
+            revision='rev', etag=None, files={'3.md': 'c', '1.md': 'a'}
+        ),
+    )
+
+    gists.refresh_gist('abc')
+
+    assignment.refresh_from_db()
+    assert assignment.task_ids == [1, 3]
+    assert assignment.tasks_count == 2
+
+
+def test_import_failure_edits_wait_message(monkeypatch):
+    failed = []
+
+    def create_assignment(*args):
+        raise RuntimeError('GitHub is down')
+
+    monkeypatch.setattr(gists, 'create_assignment', create_assignment)
+    monkeypatch.setattr(
+        notify,
+        'notify_assignment_import_failed',
+        lambda chat_id, message_id, text, errors=None: failed.append(
+            message_id
+        ),
+    )
+
+    with pytest.raises(RuntimeError):
+        tasks.import_assignment_gist(
+            1, 2, 'https://gist.github.com/u/abc', 3, 'homework', 'hw', 4
+        )
+
+    assert failed == [2]
+
+
+def test_fetch_gist_is_authorized(monkeypatch):
+    requested = []
+
+    class Response:
+        status_code = 200
+        headers = {'ETag': 'etag-1'}
+        text = 'big task'
+
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return {
+                'updated_at': '2020-11-15T10:00:00Z',
+                'files': {
+                    '1.md': {'content': 'task', 'truncated': False},
+                    '2.md': {'raw_url': 'https://raw/2.md', 'truncated': True},
+                },
+            }
+
+    def get(url, headers=None, **kwargs):
+        requested.append((url, headers['Authorization']))
+        return Response()
+
+    monkeypatch.setattr(gh, '_get_or_create_token', lambda: 'secret')
+    monkeypatch.setattr(gh.requests, 'get', get)
+
+    snapshot = gh.fetch_gist('abc')
+
+    assert snapshot.files == {'1.md': 'task', '2.md': 'big task'}
+    assert requested == [
+        ('https://api.github.com/gists/abc', 'token secret'),
+        ('https://raw/2.md', 'token secret'),
+    ]
@@ -1,6 +1,77 @@
+import io
+import os
+
+from bot.api import parsers
+from bot.logic import gh
+from bot.logic import gh_events
+
+
 def test_webhook(anon, load_json):
     anon.post(
         '/api/bot/github',
         load_json('issue_comment_payload.json'),
         **{'HTTP_X_GITHUB_EVENT': 'issue_comment'},
     )
+
+
+def test_dispatcher_routes_by_event_and_action():
+    dispatcher = gh.EventDispatcher()
+    headers = {gh.GITHUB_EVENT_HEADER: 'issue_comment'}
+
+    handlers = dispatcher.resolve(headers, {'action': 'created'})
+
+    assert [type(handler) for handler in handlers] == [
+        gh_events.CommentHandler
+    ]
+    assert dispatcher.resolve(headers, {'action': 'deleted'}) == []
+    assert not dispatcher.is_supported({gh.GITHUB_EVENT_HEADER: 'watch'})
+
+
+def test_webhook_parser_projects_fields(get_path, load_json):
+    dispatcher = gh.EventDispatcher()
+    fields = dispatcher.get_fields({gh.GITHUB_EVENT_HEADER: 'issue_comment'})
+
+    with open(get_path('issue_comment_payload.json'), 'rb') as file:
+        payload = parsers.GithubWebhookParser().parse(
+            file, parser_context={'fields': fields}
+        )
+
+    full_payload = load_json('issue_comment_payload.json')
+
+    assert payload == {
+        'action': full_payload['action'],
+        'issue': {'html_url': full_payload['issue']['html_url']},
+        'comment': {
+            'body': full_payload['comment']['body'],
+            'user': {'login': full_payload['comment']['user']['login']},
+        },
+    }
+
+
+def test_webhook_parser_stops_after_fields(get_path, load_json):
+    dispatcher = gh.EventDispatcher()
+    fields = dispatcher.get_fields({gh.GITHUB_EVENT_HEADER: 'push'})
+    path = get_path('push_payload.json')
+
+    class Body(io.FileIO):
+        consumed = 0
+
+        def read(self, size=-1):
+            chunk = super().read(size)
+            Body.consumed += len(chunk)
+            return chunk
+
+    with Body(path) as file:
+        payload = parsers.GithubWebhookParser().parse(
+            file, parser_context={'fields': fields}
+        )
+
+    full_payload = load_json('push_payload.json')
+
+    assert payload == {
+        'ref': full_payload['ref'],
+        'repository': {'name': full_payload['repository']['name']},
+        'pusher': {'name': full_payload['pusher']['name']},
+    }
+    # The commit list follows pusher and is never read
+    assert Body.consumed < os.path.getsize(path) / 10
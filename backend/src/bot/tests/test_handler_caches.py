@@ -0,0 +1,249 @@
+import types
+
+from django.core.cache import cache
+from django.core.cache.backends import locmem
+import github
+
+from bot import models
+from bot import tasks
+from bot.logic import gh
+from bot.logic import handlers
+from bot.logic import helpers
+from bot.logic import keyboards
+from bot.logic import notify
+from bot.logic import routing
+from bot.logic import user_context
+
+
+def test_user_context_is_invalidated_on_group_change(
+    db, django_assert_num_queries
+):
+    cache.clear()
+    user = models.BotUser.objects.create(
+        first_name='ivan',
+        last_name='pupkin',
+        role=models.BotUserRole.Student.value,
+        telegram_chat_id=100,
+    )
+
+    assert user_context.get_user_context(100).group_ids == ()
+    with django_assert_num_queries(0):
+        user_context.get_user_context(100)
+
+    group = models.Groups.objects.create(id=202, name='test group')
+    group.users.add(user)
+
+    assert user_context.get_user_context(100).group_ids == (202,)
+    assert user_context.get_user_context(101) is None
+
+
+def test_keyboard_is_rebuilt_on_data_change_in_other_process(
+    db, monkeypatch, django_assert_num_queries
+):
+    cache.clear()
+    keyboards.shared_cache.clear()
+    builds = []
+
+    def build():
+        builds.append(1)
+        return helpers.inline_keyboard(
+            models.Groups.objects.order_by('name'),
+            'group_requested',
+            alias_col='id',
+        )
+
+    def get_keyboard():
+        return keyboards.get_keyboard(
+            'group_requested', build, data=[keyboards.GROUPS]
+        )
+
+    models.Groups.objects.create(id=201, name='group 1')
+    get_keyboard()
+    with django_assert_num_queries(0):
+        get_keyboard()
+    assert len(builds) == 1
+
+    # A celery worker has its own local cache, only the shared one is common
+    with monkeypatch.context() as patch:
+        patch.setattr(keyboards, 'cache', locmem.LocMemCache('worker', {}))
+        models.Groups.objects.create(id=202, name='group 2')
+
+    # The version is taken from the shared cache once the local one expires
+    assert len(get_keyboard().inline_keyboard) == 1
+    cache.delete(keyboards._version_key(keyboards.GROUPS))
+
+    assert len(get_keyboard().inline_keyboard) == 2
+    assert len(builds) == 2
+
+
+def test_test_upload_is_available_after_assignment_enabled(
+    db, django_assert_num_queries
+):
+    cache.clear()
+    owner = models.BotUser.objects.create(
+        first_name='petr',
+        last_name='petrov',
+        role=models.BotUserRole.Teacher.value,
+    )
+    group = models.Groups.objects.create(id=202, name='test group')
+    assignment = models.Assignment.objects.create(
+        name='test 1',
+        type=models.AssignmentType.Test.value,
+        gist_url='none',
+        owner=owner,
+        group=group,
+        seq=1,
+    )
+
+    def get_commands():
+        return [
+            command['alias']
+            for command in helpers.get_user_commands(
+                models.BotUserRole.Student.value, (group.id,)
+            )
+        ]
+
+    assert get_commands() == ['upload_homework']
+    with django_assert_num_queries(0):
+        assert get_commands() == ['upload_homework']
+
+    assignment.is_enabled = True
+    assignment.save()
+
+    assert get_commands() == ['upload_homework', 'upload_test']
+
+
+def test_github_login_check_is_cached(monkeypatch):
+    cache.clear()
+    requested = []
+
+    class Client:
+        def get_user(self, login):
+            requested.append(login)
+            if login != 'octocat':
+                raise github.UnknownObjectException(404, {})
+
+    monkeypatch.setattr(gh, 'get_client', lambda anon=False: Client())
+
+    assert gh.is_github_user('octocat')
+    assert gh.is_github_user('OctoCat')
+    assert not gh.is_github_user('nobody')
+    assert not gh.is_github_user('nobody')
+    assert requested == ['octocat', 'nobody']
+
+
+def test_taken_github_login_edits_wait_message(db, monkeypatch):
+    models.BotUser.objects.create(
+        first_name='Петр', last_name='Петров', github_login='octocat'
+    )
+    user = models.BotUser.objects.create(first_name='Иван', last_name='Пупкин')
+    edited = []
+
+    monkeypatch.setattr(gh, 'is_github_user', lambda login: True)
+    monkeypatch.setattr(
+        notify,
+        'edit_message',
+        lambda chat_id, message_id, msg, **kwargs: edited.append(msg),
+    )
+
+    tasks.register_github_login(1, 2, user.id, 'octocat', None)
+
+    assert edited == [
+        helpers.get_message('github_login_taken', github_login='octocat')
+    ]
+    user.refresh_from_db()
+    assert user.github_login is None
+
+
+def test_git_ref_route_follows_transitioned_submission(
+    db, django_assert_num_queries
+):
+    cache.clear()
+    student = models.BotUser.objects.create(
+        first_name='Иван', last_name='Пупкин'
+    )
+    repository = models.GithubRepository.objects.create(
+        name='assignments_pupkin', owner=student, url='none'
+    )
+    ref = 'refs/heads/assignments-homework-1-1'
+    first = models.Submission.objects.create(
+        author=student,
+        task_id=1,
+        status=models.SubmissionStatus.Accepted.value,
+        objectkey='none',
+        repository=repository,
+        git_ref=ref,
+    )
+    second = models.Submission.objects.create(
+        author=student,
+        task_id=1,
+        status=models.SubmissionStatus.Processing.value,
+        objectkey='none',
+    )
+
+    route = routing.get_submission_id_by_git_ref
+    with django_assert_num_queries(1):
+        assert route('assignments_pupkin', ref) == first.id
+    with django_assert_num_queries(1):
+        assert route('assignments_pupkin', 'refs/heads/unknown') is None
+
+    # The next submission of the task reuses the branch
+    models.Submission.transition(
+        second.id,
+        models.SubmissionStatus.Review,
+        repository=repository,
+        git_ref=ref,
+    )
+
+    assert route('assignments_pupkin', ref) == second.id
+
+
+def test_text_after_registration_does_not_register_again(db, monkeypatch):
+    cache.clear()
+    user = models.BotUser.objects.create(first_name='Иван', last_name='Пупкин')
+    edited = []
+    queued = []
+
+    monkeypatch.setattr(gh, 'is_github_user', lambda login: True)
+    monkeypatch.setattr(
+        notify,
+        'edit_message',
+        lambda chat_id, message_id, msg, **kwargs: edited.append(msg),
+    )
+    monkeypatch.setattr(
+        tasks.register_github_login,
+        'delay',
+        lambda *args: tasks.register_github_login(*args) or queued.append(1),
+    )
+
+    def send_text(text):
+        replies = []
+        message = types.SimpleNamespace(
+            chat_id=100,
+            message_id=1,
+            text=text,
+            reply_text=lambda msg, **kwargs: replies.append(msg) or message,
+        )
+        update = types.SimpleNamespace(
+            message=message,
+            effective_chat=types.SimpleNamespace(id=100),
+            effective_user=types.SimpleNamespace(username='pupkin'),
+        )
+        context = types.SimpleNamespace(user_data={'user_id': str(user.id)})
+        return handlers.github_login_callback(update, context), replies
+
+    state, _ = send_text('octocat')
+    assert state == handlers.GITHUN_LOGIN_REQUESTED
+    assert queued == [1]
+
+    state, replies = send_text('hello')
+    assert state == handlers.KNOWN
+    assert replies == [helpers.get_message('start_to_do')]
+    assert queued == [1]
+
+    # A stale conversation of another chat can not take the name over
+    tasks.register_github_login(200, 1, user.id, 'other', None)
+
+    assert edited[-1] == helpers.get_message('already_registered')
+    user.refresh_from_db()
+    assert (user.github_login, user.telegram_chat_id) == ('octocat', 100)
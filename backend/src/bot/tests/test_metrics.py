@@ -0,0 +1,78 @@
+import base64
+import time
+import types
+
+import prometheus_client
+import pytest
+
+from app import metrics
+
+
+def _get_sample(name, labels):
+    return prometheus_client.REGISTRY.get_sample_value(name, labels) or 0
+
+
+def _basic_auth(credentials):
+    return 'Basic ' + base64.b64encode(credentials.encode()).decode()
+
+
+def test_metrics_endpoint(client, settings):
+    settings.METRICS_AUTH = 'prometheus:secret'
+    labels = {'service': 'telegram', 'method': 'sendMessage'}
+    errors = _get_sample('bot_api_errors_total', labels)
+
+    with metrics.stage('upload'):
+        pass
+
+    with pytest.raises(RuntimeError):
+        with metrics.api_call('telegram', 'sendMessage'):
+            raise RuntimeError
+
+    response = client.get(
+        '/metrics', HTTP_AUTHORIZATION=_basic_auth('prometheus:secret')
+    )
+
+    assert response.status_code == 200
+    assert 'bot_submission_stage_seconds_count{stage="upload"}' in (
+        response.content.decode()
+    )
+    assert _get_sample('bot_api_errors_total', labels) == errors + 1
+
+
+def test_metrics_endpoint_requires_auth(client, settings):
+    settings.METRICS_AUTH = None
+    assert client.get('/metrics').status_code == 404
+
+    settings.METRICS_AUTH = 'prometheus:secret'
+    assert client.get('/metrics').status_code == 401
+    assert client.get(
+        '/metrics', HTTP_AUTHORIZATION=_basic_auth('prometheus:wrong')
+    ).status_code == 401
+
+
+@pytest.mark.parametrize('nested', [False, True])
+def test_queue_wait_from_publish_header(monkeypatch, nested):
+    task_name = 'bot.tasks.process_file'
+    labels = {'task': task_name}
+    waited = _get_sample('bot_celery_queue_wait_seconds_sum', labels)
+    now = time.time()
+
+    # Only the clock seen by the metrics module is moved
+    clock = types.SimpleNamespace(time=lambda: now)
+    monkeypatch.setattr(metrics, 'time', clock)
+    headers = {}
+    metrics.on_task_published(headers=headers)
+
+    if nested:
+        request = types.SimpleNamespace(headers=headers)
+    else:
+        request = types.SimpleNamespace(headers=None, **headers)
+
+    clock.time = lambda: now + 2.5
+    metrics.on_task_prerun(
+        task=types.SimpleNamespace(name=task_name, request=request)
+    )
+
+    assert _get_sample(
+        'bot_celery_queue_wait_seconds_sum', labels
+    ) == pytest.approx(waited + 2.5)
@@ -0,0 +1,88 @@
+import pytest
+from django.db import connection
+from django.db.models import Count
+
+from bot import models
+
+
+@pytest.fixture
+def no_seqscan(db):
+    if connection.vendor != 'postgresql':
+        pytest.skip('Query plans are checked on PostgreSQL only')
+    with connection.cursor() as cursor:
+        cursor.execute('SET LOCAL enable_seqscan = off')
+
+
+def _assert_index_scan(queryset, index):
+    # With seqscan off almost any plan has an index, the name must match
+    plan = queryset.explain()
+    assert 'Seq Scan' not in plan, plan
+    assert index in plan, plan
+
+
+def test_webhook_pull_url_lookup(no_seqscan):
+    _assert_index_scan(
+        models.Submission.objects.filter(
+            pull_url='https://github.com/pykili/assignments_test/pull/1'
+        ),
+        'bot_submission_pull_url_',
+    )
+
+
+def test_webhook_ref_lookup(no_seqscan):
+    _assert_index_scan(
+        models.Submission.objects.filter(
+            git_ref='refs/heads/assignments-homework-1-1',
+            repository__name='assignments_test',
+        ),
+        'submission_repo_ref_idx',
+    )
+
+
+def test_status_event_lookup(no_seqscan):
+    _assert_index_scan(
+        models.SubmissionEvent.objects.filter(
+            submission_id=1, event=models.SubmissionStatus.Review.value
+        ).order_by('-occured_at'),
+        'subevent_sub_event_at_idx',
+    )
+
+
+def test_review_page(no_seqscan):
+    _assert_index_scan(
+        models.Submission.get_for_review([1])
+        .filter(real_assignment_id=1)
+        .order_by('real_assignment_id', 'task_id', 'id'),
+        'submission_review_idx',
+    )
+
+
+def test_assignment_status_counts(no_seqscan):
+    _assert_index_scan(
+        models.Submission.objects.filter(real_assignment_id=1)
+        .values('status')
+        .annotate(total=Count('status')),
+        'submission_asgn_status_idx',
+    )
+
+
+def test_author_assignment_lookup(no_seqscan):
+    _assert_index_scan(
+        models.Submission.objects.filter(author_id=1, real_assignment_id=1),
+        'submission_author_asgn_idx',
+    )
+
+
+def test_github_login_lookup(no_seqscan):
+    _assert_index_scan(
+        models.BotUser.filter_by_github_login('Octocat'),
+        'bot_botuser_github_login_lower_idx',
+    )
+
+
+def test_repository_delete_lookup(no_seqscan):
+    # The FK has no index of its own, cascades use the composite one
+    _assert_index_scan(
+        models.Submission.objects.filter(repository_id=1),
+        'submission_repo_ref_idx',
+    )
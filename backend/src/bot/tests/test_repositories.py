@@ -0,0 +1,197 @@
+import types
+
+import github
+import pytest
+
+from app import exceptions
+
+from bot import models
+from bot.logic import gh
+from bot.logic import provisioning
+
+
+class _FakeRepo:
+    default_branch = 'main'
+
+    def __init__(self, name='assignments_ivan', empty=False):
+        self.name = name
+        self.html_url = f'https://github.com/pykili/{name}'
+        self.empty = empty
+        self.calls = []
+        self.ref = types.SimpleNamespace(
+            object=types.SimpleNamespace(sha='head'),
+            edit=lambda sha: self.calls.append(('edit_ref', sha)),
+        )
+
+    def get_contents(self, path):
+        self.calls.append(('get_contents', path))
+        raise github.UnknownObjectException(404, {})
+
+    def get_git_ref(self, ref):
+        self.calls.append(('get_git_ref', ref))
+        if self.empty:
+            raise github.GithubException(409, {'message': 'Repo is empty'})
+        return self.ref
+
+    def create_file(self, path, message, content):
+        self.calls.append(('create_file', path))
+
+    def get_git_commit(self, sha):
+        return types.SimpleNamespace(sha=sha, tree='base-tree')
+
+    def create_git_tree(self, tree, base_tree):
+        paths = sorted(element._identity['path'] for element in tree)
+        self.calls.append(('create_git_tree', paths))
+        return 'tree'
+
+    def create_git_commit(self, message, tree, parents):
+        self.calls.append(('create_git_commit', [p.sha for p in parents]))
+        return types.SimpleNamespace(sha='bootstrap')
+
+    def add_to_collaborators(self, login, permission):
+        self.calls.append(('add_to_collaborators', login, permission))
+        return None
+
+
+def test_bootstrap_repo_in_one_commit(db):
+    user = models.BotUser.objects.create(
+        first_name='Иван',
+        last_name='Пупкин',
+        github_login='ivan',
+        role=models.BotUserRole.Student.value,
+    )
+    repo = _FakeRepo()
+
+    gh._bootstrap_repo(repo, user)
+
+    assert ('add_to_collaborators', 'ivan', 'push') in repo.calls
+    assert ('create_git_tree', ['.bootstrap', 'README.md']) in repo.calls
+    assert ('create_git_commit', ['head']) in repo.calls
+    assert ('edit_ref', 'bootstrap') in repo.calls
+    assert [call[0] for call in repo.calls].count('create_git_commit') == 1
+
+
+def _create_student():
+    return models.BotUser.objects.create(
+        first_name='Иван',
+        last_name='Пупкин',
+        github_login='ivan',
+        role=models.BotUserRole.Student.value,
+    )
+
+
+def test_bootstrap_empty_repo_with_contents_api(db):
+    repo = _FakeRepo(empty=True)
+
+    gh._bootstrap_repo(repo, _create_student())
+
+    assert [call for call in repo.calls if call[0] == 'create_file'] == [
+        ('create_file', 'README.md'),
+        ('create_file', '.bootstrap'),
+    ]
+
+
+def test_bootstrap_created_repo_ignores_template_marker(db):
+    repo = _FakeRepo()
+
+    gh._bootstrap_repo(repo, _create_student(), created=True)
+
+    assert ('get_contents', '.bootstrap') not in repo.calls
+    assert ('add_to_collaborators', 'ivan', 'push') in repo.calls
+    assert ('edit_ref', 'bootstrap') in repo.calls
+
+
+def test_head_ref_without_attempts_raises():
+    with pytest.raises(exceptions.BackendException):
+        gh._get_head_ref(_FakeRepo(), 0)
+
+
+class _FakeOrg:
+    """Repositories by name, None for a repository GitHub fails on"""
+
+    def __init__(self, repos):
+        self.repos = repos
+
+    def create_repo(self, name, **kwargs):
+        if name in self.repos:
+            raise github.GithubException(422, {'message': 'name exists'})
+        self.repos[name] = _FakeRepo(name)
+        return self.repos[name]
+
+    def get_repo(self, name):
+        if self.repos.get(name) is None:
+            raise github.GithubException(500, {'message': 'server error'})
+        return self.repos[name]
+
+
+class _BootstrappedRepo:
+    def __init__(self, name):
+        self.name = name
+        self.html_url = f'https://github.com/pykili/{name}'
+
+    def get_contents(self, path):
+        return path
+
+
+def _create_students(*logins):
+    return [
+        models.BotUser.objects.create(
+            first_name=login,
+            last_name=login,
+            github_login=login,
+            role=models.BotUserRole.Student.value,
+        )
+        for login in logins
+    ]
+
+
+def _use_org(monkeypatch, org):
+    client = types.SimpleNamespace(get_organization=lambda name: org)
+    monkeypatch.setattr(gh, 'get_client', lambda anon=False: client)
+
+
+def test_provision_skips_existing_repositories(transactional_db, monkeypatch):
+    with_db_repo, with_gh_repo = _create_students('ivan', 'petr')
+    models.BotUser.objects.create(
+        first_name='teacher',
+        last_name='teacher',
+        github_login='teacher',
+        role=models.BotUserRole.Teacher.value,
+    )
+    models.GithubRepository.objects.create(
+        name='assignments_ivan', owner=with_db_repo, url='none'
+    )
+    org = _FakeOrg({'assignments_petr': _BootstrappedRepo('assignments_petr')})
+    _use_org(monkeypatch, org)
+
+    result = provisioning.provision_repositories(workers=2, rate=1000)
+
+    assert result == provisioning.ProvisionResult(created=1, failed=[])
+    assert set(org.repos) == {'assignments_petr'}
+    assert with_gh_repo.repository.get().name == 'assignments_petr'
+
+
+def test_provision_continues_after_failure(transactional_db, monkeypatch):
+    first, broken, last = _create_students('anna', 'boris', 'vera')
+    _use_org(monkeypatch, _FakeOrg({'assignments_boris': None}))
+
+    result = provisioning.provision_repositories(workers=1, rate=1000)
+
+    assert result == provisioning.ProvisionResult(
+        created=2, failed=[broken.id]
+    )
+    assert first.repository.exists()
+    assert not broken.repository.exists()
+    assert last.repository.exists()
+
+
+def test_rate_limiter_spaces_calls(monkeypatch):
+    sleeps = []
+    clock = types.SimpleNamespace(monotonic=lambda: 10.0, sleep=sleeps.append)
+    monkeypatch.setattr(provisioning, 'time', clock)
+
+    limiter = provisioning.RateLimiter(rate=2)
+    for _ in range(3):
+        limiter.wait()
+
+    assert sleeps == [0.5, 1.0]
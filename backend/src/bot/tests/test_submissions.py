@@ -1,4 +1,12 @@
+import json
+
+from django.core.management import call_command
+import pytest
+
 from bot import models
+from bot import tasks
+from bot.logic import notify
+from bot.logic import processing
 
 
 def test_get_staff(db):
@@ -28,3 +36,359 @@ def test_get_staff(db):
 
     assert len(staff) == 1
     assert staff[0].id == teacher.id
+
+
+def test_create_event_updates_status_timestamps(db):
+    student = models.BotUser.objects.create(
+        first_name='ivan',
+        last_name='pupkin',
+        role=models.BotUserRole.Student.value,
+    )
+    submission = models.Submission.objects.create(
+        author=student,
+        task_id=1,
+        status=models.SubmissionStatus.Review.value,
+        objectkey='none',
+    )
+
+    submission.create_event('review')
+
+    assert submission.status_changed_at is not None
+    assert submission.first_reviewed_at is None
+    assert not submission.seen
+
+    submission.status = models.SubmissionStatus.Needwork.value
+    submission.create_event('needwork')
+
+    submission.refresh_from_db()
+    assert submission.first_reviewed_at == submission.status_changed_at
+    assert submission.seen
+
+
+def test_transition_rejects_illegal_status(db):
+    student = models.BotUser.objects.create(
+        first_name='ivan',
+        last_name='pupkin',
+        role=models.BotUserRole.Student.value,
+    )
+    submission = models.Submission.objects.create(
+        author=student,
+        task_id=1,
+        status=models.SubmissionStatus.Review.value,
+        objectkey='none',
+    )
+
+    assert models.Submission.transition(
+        submission.id,
+        models.SubmissionStatus.Accepted,
+        'accepted',
+        payload={'accepted_by': student.id},
+    )
+    assert not models.Submission.transition(
+        submission.id, models.SubmissionStatus.Review, 'review'
+    )
+
+    submission.refresh_from_db()
+    assert submission.status == models.SubmissionStatus.Accepted.value
+    assert submission.seen
+    assert submission.first_reviewed_at == submission.status_changed_at
+    assert list(submission.events.values_list('event', 'payload')) == [
+        ('accepted', {'accepted_by': student.id})
+    ]
+
+
+def test_list_submissions_joins_accepted_event(db, tmp_path):
+    teacher = models.BotUser.objects.create(
+        first_name='petr',
+        last_name='petrov',
+        role=models.BotUserRole.Teacher.value,
+    )
+    student = models.BotUser.objects.create(
+        first_name='ivan',
+        last_name='pupkin',
+        role=models.BotUserRole.Student.value,
+    )
+    submission = models.Submission.objects.create(
+        author=student,
+        task_id=1,
+        status=models.SubmissionStatus.Review.value,
+        objectkey='none',
+    )
+    models.Submission.transition(
+        submission.id,
+        models.SubmissionStatus.Accepted,
+        'accepted',
+        payload={'accepted_by': teacher.id},
+    )
+    output = tmp_path / 'submissions.csv'
+
+    call_command('list_submissions', format='csv', output=str(output))
+
+    header, row = output.read_text().splitlines()
+    assert header.startswith('submission_id,')
+    assert row.startswith(f'{submission.id},')
+    assert row.endswith(',petrov petr')
+    assert 'pupkin ivan' in row
+
+
+def test_list_submissions_to_parquet(db, tmp_path):
+    from pyarrow import parquet
+
+    student = models.BotUser.objects.create(
+        first_name='ivan',
+        last_name='pupkin',
+        role=models.BotUserRole.Student.value,
+    )
+    submissions = [
+        models.Submission.objects.create(
+            author=student,
+            task_id=task_id,
+            status=models.SubmissionStatus.Review.value,
+            objectkey='none',
+        )
+        for task_id in (1, 2, 3)
+    ]
+    output = tmp_path / 'submissions.parquet'
+
+    call_command(
+        'list_submissions',
+        format='parquet',
+        output=str(output),
+        chunk_size=2,
+    )
+
+    table = parquet.read_table(str(output)).to_pydict()
+    assert table['submission_id'] == [item.id for item in submissions]
+    assert table['task_id'] == [1, 2, 3]
+
+
+def test_add_accepted_submission_transitions(db, monkeypatch):
+    student = models.BotUser.objects.create(
+        first_name='ivan',
+        last_name='pupkin',
+        role=models.BotUserRole.Student.value,
+        telegram_chat_id=100,
+        github_login='pupkin',
+    )
+    gist_url = 'https://gist.github.com/pupkin/1'
+    transitioned = []
+
+    def start_processing(submission_id, notify=True):
+        models.Submission.objects.filter(id=submission_id).update(
+            status=models.SubmissionStatus.Review.value
+        )
+
+    def receiver(sender, submission_id, status, **kwargs):
+        transitioned.append((submission_id, status))
+
+    monkeypatch.setattr(processing, 'start_processing', start_processing)
+    models.submission_transitioned.connect(receiver)
+    try:
+        call_command(
+            'add_submission',
+            telegram_chat_id=100,
+            assignment_id=1,
+            task_id=1,
+            accepted=True,
+            objectkey='none',
+            assignment_gist_url='none',
+            submission_gist_url=gist_url,
+        )
+    finally:
+        models.submission_transitioned.disconnect(receiver)
+
+    submission = models.Submission.objects.get(author=student)
+    assert submission.status == models.SubmissionStatus.Accepted.value
+    assert submission.status_changed_at is not None
+    assert list(submission.events.values_list('event', 'payload')) == [
+        ('migrated', {'submission_gist_url': gist_url})
+    ]
+    assert transitioned == [
+        (submission.id, models.SubmissionStatus.Accepted)
+    ]
+
+
+def test_transition_moves_assignment_stats(db):
+    teacher = models.BotUser.objects.create(
+        first_name='petr',
+        last_name='petrov',
+        role=models.BotUserRole.Teacher.value,
+    )
+    group = models.Groups.objects.create(id=202, name='test group')
+    assignment = models.Assignment.objects.create(
+        name='hw1',
+        type=models.AssignmentType.Homework.value,
+        gist_url='none',
+        owner=teacher,
+        group=group,
+        seq=1,
+    )
+    submission = models.Submission.objects.create(
+        author=teacher,
+        real_assignment=assignment,
+        task_id=1,
+        status=models.SubmissionStatus.Review.value,
+        objectkey='none',
+    )
+
+    assert models.AssignmentStats.get_counts(assignment.id) == {'review': 1}
+
+    models.Submission.transition(
+        submission.id, models.SubmissionStatus.Needwork, 'needwork'
+    )
+    models.Submission.transition(
+        submission.id, models.SubmissionStatus.Needwork, 'needwork'
+    )
+
+    assert models.AssignmentStats.get_counts(assignment.id) == {
+        'review': 0,
+        'needwork': 1,
+    }
+
+    models.AssignmentStats.objects.all().delete()
+    models.AssignmentStats.rebuild()
+
+    assert models.AssignmentStats.get_counts(assignment.id) == {
+        'needwork': 1
+    }
+
+
+def test_student_push_reopens_only_needwork(db):
+    student = models.BotUser.objects.create(
+        first_name='ivan',
+        last_name='pupkin',
+        role=models.BotUserRole.Student.value,
+    )
+    processing = models.Submission.objects.create(
+        author=student,
+        task_id=1,
+        status=models.SubmissionStatus.Processing.value,
+        objectkey='none',
+    )
+    needwork = models.Submission.objects.create(
+        author=student,
+        task_id=2,
+        status=models.SubmissionStatus.Needwork.value,
+        objectkey='none',
+    )
+
+    tasks.process_student_push(processing.id, student.id, need_notify=False)
+    tasks.process_student_pull_comment(
+        needwork.id, student.id, 'fixed', need_notify=False
+    )
+
+    processing.refresh_from_db()
+    assert processing.status == models.SubmissionStatus.Processing.value
+    assert list(processing.events.values_list('event', flat=True)) == [
+        'push'
+    ]
+
+    needwork.refresh_from_db()
+    assert needwork.status == models.SubmissionStatus.Review.value
+    assert list(
+        needwork.events.order_by('id').values_list('event', flat=True)
+    ) == ['comment', 'review']
+
+
+def test_repeated_needwork_is_recorded(db):
+    student = models.BotUser.objects.create(
+        first_name='ivan',
+        last_name='pupkin',
+        role=models.BotUserRole.Student.value,
+    )
+    submission = models.Submission.objects.create(
+        author=student,
+        task_id=1,
+        status=models.SubmissionStatus.Review.value,
+        objectkey='none',
+    )
+
+    tasks.process_needwork(submission.id, need_notify=False)
+    tasks.process_needwork(submission.id, need_notify=False)
+
+    submission.refresh_from_db()
+    assert submission.status == models.SubmissionStatus.Needwork.value
+    assert list(submission.events.values_list('event', flat=True)) == [
+        'needwork',
+        'needwork',
+    ]
+
+
+def test_needwork_while_processing_is_reported(db, monkeypatch):
+    teacher = models.BotUser.objects.create(
+        first_name='petr',
+        last_name='petrov',
+        role=models.BotUserRole.Teacher.value,
+        telegram_chat_id=100,
+    )
+    submission = models.Submission.objects.create(
+        author=teacher,
+        task_id=1,
+        status=models.SubmissionStatus.Processing.value,
+        objectkey='none',
+    )
+    rejected = []
+    monkeypatch.setattr(
+        notify,
+        'notify_transition_rejected',
+        lambda reviewer, submission, status: rejected.append(
+            (reviewer.id, submission.id, status)
+        ),
+    )
+
+    tasks.process_needwork(submission.id, reviewer_id=teacher.id)
+
+    submission.refresh_from_db()
+    assert submission.status == models.SubmissionStatus.Processing.value
+    assert not submission.events.exists()
+    assert rejected == [
+        (teacher.id, submission.id, models.SubmissionStatus.Needwork)
+    ]
+
+
+@pytest.mark.parametrize(
+    'occured_at', ['2020-10-19T10:00:00+00:00', '2020-10-19T10:00:00']
+)
+def test_apply_events_skips_applied_events(
+    transactional_db, tmp_path, monkeypatch, occured_at
+):
+    monkeypatch.chdir(tmp_path)
+    student = models.BotUser.objects.create(
+        first_name='ivan',
+        last_name='pupkin',
+        github_login='Pupkin',
+        role=models.BotUserRole.Student.value,
+    )
+    submission = models.Submission.objects.create(
+        author=student,
+        task_id=1,
+        status=models.SubmissionStatus.Needwork.value,
+        objectkey='none',
+        pull_url='https://github.com/pykili/a/pull/1',
+    )
+    events_file = tmp_path / 'events.jsonl'
+    events_file.write_text(
+        json.dumps(
+            {
+                'type': 'submission.push',
+                'pull_url': submission.pull_url,
+                'body': '',
+                'author': 'pupkin',
+                'occured_at': occured_at,
+                'repo': 'a',
+            }
+        )
+        + '\n'
+    )
+
+    call_command('apply_events', file=str(events_file), workers=1)
+    assert not submission.events.exists()
+    assert not (tmp_path / 'events.jsonl.checkpoint').exists()
+
+    # A crashed run is resumed from before the already applied batch
+    for _ in range(2):
+        call_command('apply_events', file=str(events_file), run=True)
+
+    assert list(
+        submission.events.order_by('id').values_list('event', flat=True)
+    ) == ['push', 'review']
@@ -0,0 +1,72 @@
+import types
+
+from opentelemetry import trace
+from opentelemetry.sdk import trace as sdk_trace
+from opentelemetry.sdk.trace import export
+from opentelemetry.sdk.trace.export import in_memory_span_exporter
+import pytest
+from telegram.utils import request as tg_request
+
+from app import tracing
+from bot.logic import notify
+
+
+@pytest.mark.parametrize('nested', [False, True])
+def test_task_span_continues_publisher_trace(monkeypatch, nested):
+    exporter = in_memory_span_exporter.InMemorySpanExporter()
+    provider = sdk_trace.TracerProvider()
+    provider.add_span_processor(export.SimpleSpanProcessor(exporter))
+    # The global provider can be set only once per process
+    monkeypatch.setattr(tracing, 'tracer', provider.get_tracer('bot'))
+
+    headers = {}
+    with tracing.tracer.start_as_current_span('webhook') as webhook_span:
+        tracing.on_task_published(headers=headers)
+
+    if nested:
+        request = types.SimpleNamespace(headers=headers)
+    else:
+        # Custom headers are attributes of the request with protocol 2
+        request = types.SimpleNamespace(headers=None, **headers)
+
+    task = types.SimpleNamespace(
+        name='bot.tasks.process_file', request=request
+    )
+    tracing.on_task_prerun(task_id='task-1', task=task)
+    tracing.on_task_failure(sender=task, exception=ValueError('boom'))
+    tracing.on_task_postrun(task=task)
+
+    task_span = exporter.get_finished_spans()[-1]
+    assert task_span.name == 'bot.tasks.process_file'
+    assert task_span.parent.span_id == webhook_span.get_span_context().span_id
+    assert task_span.context.trace_id == (
+        webhook_span.get_span_context().trace_id
+    )
+    assert task_span.status.status_code == trace.StatusCode.ERROR
+    assert not trace.get_current_span().get_span_context().is_valid
+
+
+def test_telegram_calls_are_traced(monkeypatch, settings):
+    settings.TELEGRAM_TOKEN = '123:token'
+    exporter = in_memory_span_exporter.InMemorySpanExporter()
+    provider = sdk_trace.TracerProvider()
+    provider.add_span_processor(export.SimpleSpanProcessor(exporter))
+    monkeypatch.setattr(tracing, 'tracer', provider.get_tracer('bot'))
+
+    # python-telegram-bot sends through its vendored urllib3
+    monkeypatch.setattr(
+        tg_request.Request,
+        '_request_wrapper',
+        lambda self, *args, **kwargs: b'{"ok": true, "result": true}',
+    )
+
+    with tracing.tracer.start_as_current_span('task') as task_span:
+        notify.edit_message(1, 2, 'hello')
+        notify.create_bot().request.retrieve('https://api.telegram.org/file')
+
+    edit_span, download_span, _ = exporter.get_finished_spans()
+    assert edit_span.name == 'telegram editMessageText'
+    assert download_span.name == 'telegram download'
+    for span in (edit_span, download_span):
+        assert span.kind == trace.SpanKind.CLIENT
+        assert span.parent.span_id == task_span.get_span_context().span_id
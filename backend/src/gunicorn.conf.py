@@ -0,0 +1,15 @@
+import os
+
+from app import metrics
+
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+
+
+def on_starting(server):
+    # Before workers are spawned, a restart must not sum up old counters
+    metrics.clear_multiproc_dir()
+
+
+def child_exit(server, worker):
+    metrics.mark_process_dead(worker.pid)